@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import stat
+import struct
+from datetime import timedelta
+from urllib.parse import urlsplit, parse_qs
+from ipaddress import ip_address
+
+from mpeg2ts.reader import PushPacketReader
+from mpeg2ts.program import ProgramDemuxer
+from subtitle.decoder import CaptionDecoders
+from subtitle.vtt import VTTGenerator
+
+LINE_LIMIT = 8192 # 購読者から読む 1 行 (SSE の request line, header) の上限
+
+class Hub:
+  # MEMO: 字幕の cue を購読者に配る (遅い購読者の queue が溢れたら、その購読者の分だけ捨てる)
+  QUEUE_SIZE = 256
+
+  def __init__(self, queue_size = QUEUE_SIZE):
+    self.queue_size = queue_size
+    self.subscribers = set()
+
+  def subscribe(self, channel = None):
+    subscriber = (channel, asyncio.Queue(self.queue_size))
+    self.subscribers.add(subscriber)
+    return subscriber
+
+  def unsubscribe(self, subscriber):
+    self.subscribers.discard(subscriber)
+
+  def publish(self, cue):
+    message = json.dumps(cue, ensure_ascii=False)
+    for channel, queue in self.subscribers:
+      if channel is not None and channel != cue['channel']: continue
+      if not queue.full(): queue.put_nowait(message)
+
+class Channel:
+  # MEMO: 一つの TS (UDP の受信, TCP/Unix の接続毎) を demux して字幕を decode する, 全て event loop の中で動く
+  READ_SIZE = 188 * 256
+
+  def __init__(self, name, hub, SIDs = None, select_all = False):
+    self.name = name
+    self.hub = hub
+    self.reader = PushPacketReader()
+    self.demuxer = ProgramDemuxer(self.reader, SIDs, select_all)
+    self.decoders = CaptionDecoders()
+    self.cues = dict()
+
+  def feed(self, data, last = False):
+    # MEMO: 一つの PES や block の失敗で channel (や同じ process の他の channel) を止めないように、ここで捕まえて記録して続ける
+    try:
+      for programs, SUBTITLE in self.demuxer.feed(data, last):
+        if not programs: continue
+        try:
+          self.decode(programs, SUBTITLE)
+        except Exception:
+          logging.exception('%s: failed to decode caption PES', self.name)
+    except Exception:
+      logging.exception('%s: failed to demux TS', self.name)
+      self.reader.begin = self.reader.end # 同じ block を次の feed で読み直さないように捨てる
+
+  def decode(self, programs, SUBTITLE):
+    for cue in self.decoders.feed(programs, SUBTITLE):
+      if cue.repeat: continue # 再送された同じ字幕文は表示中の cue の続き
+      VTT = VTTGenerator(None, cue)
+      VTT.generate()
+      for program in programs:
+        if program.timeline.empty(): continue
+        self.publish(program, VTT)
+
+  def publish(self, program, VTT):
+    begin = program.timeline.seconds(VTT.PTS())
+    end = begin + VTT.end_time if VTT.end_time else None
+    # MEMO: TOT/TDT を受け取っていれば放送時刻 (JST) も付ける
+    wallclock = program.timeline.datetime(VTT.PTS())
+    begin_time = wallclock.isoformat(timespec='milliseconds') if wallclock else None
+    end_time = (wallclock + timedelta(seconds=VTT.end_time)).isoformat(timespec='milliseconds') if wallclock and VTT.end_time else None
+
+    # MEMO: 終わりの決まっていない前の cue はこの PES の時刻で閉じる
+    previous = self.cues.pop(program.program_number, None)
+    if previous is not None:
+      previous['end'] = begin
+      previous['end_time'] = begin_time
+      self.hub.publish(previous)
+
+    if not VTT.text: return
+    cue = { 'channel': self.name, 'SID': program.program_number, 'PTS': VTT.PTS(), 'begin': begin, 'end': end, 'begin_time': begin_time, 'end_time': end_time, 'text': VTT.text, 'vtt': VTT.vtt }
+    if end is not None:
+      self.hub.publish(cue)
+    else:
+      self.cues[program.program_number] = cue
+
+  def close(self):
+    self.feed(b'', True)
+    for cue in self.cues.values(): # 入力の終わりまで表示されていたものとする
+      self.hub.publish(cue)
+    self.cues.clear()
+
+class DatagramProtocol(asyncio.DatagramProtocol):
+
+  def __init__(self, channel):
+    self.channel = channel
+
+  def datagram_received(self, data, address):
+    self.channel.feed(data) # 7x188 byte (RTP の header が付いていても SYNC_BYTE で同期し直す)
+
+  def connection_lost(self, exc):
+    self.channel.close()
+
+def parse_input(value):
+  # MEMO: [name=]udp://host:port, [name=]tcp://host:port, [name=]unix:///path (tcp, unix は送信側からの接続を待つ)
+  name, separator, url = value.partition('=')
+  if not separator or '://' in name:
+    name, url = None, value
+  url = urlsplit(url)
+  if url.scheme not in ('udp', 'tcp', 'unix'):
+    raise argparse.ArgumentTypeError(f'unsupported input: {value}')
+  return name or (os.path.basename(url.path) if url.scheme == 'unix' else str(url.port)), url
+
+async def open_input(name, url, hub, SIDs, select_all):
+  loop = asyncio.get_running_loop()
+
+  if url.scheme == 'udp':
+    # MEMO: udp://[ff02::1]:1234 などの IPv6 も受けられるように address family は getaddrinfo で決める
+    family, type, proto, _, address = socket.getaddrinfo(url.hostname or '0.0.0.0', url.port, type=socket.SOCK_DGRAM, flags=socket.AI_PASSIVE)[0]
+    sock = socket.socket(family, type, proto)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    if ip_address(address[0]).is_multicast:
+      interface = parse_qs(url.query).get('interface', [None])[0]
+      if family == socket.AF_INET6: # interface は名前か index (無ければ既定の interface)
+        index = 0 if interface is None else int(interface) if interface.isdigit() else socket.if_nametoindex(interface)
+        sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_JOIN_GROUP, struct.pack('16sI', socket.inet_pton(socket.AF_INET6, address[0]), index))
+      else: # interface はその interface の IPv4 address
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, struct.pack('4s4s', socket.inet_aton(address[0]), socket.inet_aton(interface or '0.0.0.0')))
+    sock.bind(address)
+    transport, _ = await loop.create_datagram_endpoint(lambda: DatagramProtocol(Channel(name, hub, SIDs, select_all)), sock=sock)
+    return transport
+
+  async def receive(reader, writer):
+    channel = Channel(name, hub, SIDs, select_all) # 接続毎に別の stream として扱う
+    try:
+      while True:
+        data = await reader.read(Channel.READ_SIZE)
+        if not data: break
+        channel.feed(data)
+    finally:
+      channel.close()
+      writer.close()
+
+  if url.scheme == 'tcp':
+    return await asyncio.start_server(receive, url.hostname, url.port)
+  else:
+    remove_socket(url.path)
+    return await asyncio.start_unix_server(receive, url.path)
+
+def remove_socket(path):
+  # MEMO: 前回残った unix socket だけを消す (間違えて指定した普通のファイルは消さずに bind で失敗させる)
+  try:
+    if stat.S_ISSOCK(os.stat(path).st_mode): os.unlink(path)
+  except FileNotFoundError:
+    pass
+
+async def wait_closed(reader):
+  # MEMO: 相手が閉じるまで待つ, 送られてきたものは 1 行ずつ捨てる (LINE_LIMIT を超える行が来たら切る)
+  try:
+    while await reader.readline(): pass
+  except (ValueError, ConnectionError):
+    pass
+
+async def send(subscriber, writer, format):
+  try:
+    while True:
+      message = await subscriber[1].get()
+      writer.write(format(message))
+      await writer.drain()
+  except (ConnectionError, asyncio.CancelledError):
+    pass
+
+async def open_json(url, hub):
+  # MEMO: 接続してきた相手に cue を 1 行 1 JSON で送り続ける
+  async def connected(reader, writer):
+    subscriber = hub.subscribe()
+    task = asyncio.ensure_future(send(subscriber, writer, lambda message: (message + '\n').encode('utf-8')))
+    await wait_closed(reader)
+    task.cancel()
+    hub.unsubscribe(subscriber)
+    writer.close()
+
+  if url.scheme == 'unix':
+    remove_socket(url.path)
+    return await asyncio.start_unix_server(connected, url.path, limit=LINE_LIMIT)
+  return await asyncio.start_server(connected, url.hostname, url.port, limit=LINE_LIMIT)
+
+async def open_sse(url, hub):
+  # MEMO: GET / で全ての channel, GET /<name> でその channel の cue を Server-Sent Events で送る
+  async def connected(reader, writer):
+    try:
+      request = await reader.readline()
+      while (await reader.readline()) not in (b'\r\n', b'\n', b''): pass
+    except ValueError: # LINE_LIMIT を超える request line, header
+      writer.write(b'HTTP/1.1 431 Request Header Fields Too Large\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+      writer.close()
+      return
+
+    method, path, *_ = request.decode('latin-1').split(' ') + ['', '']
+    if method != 'GET':
+      writer.write(b'HTTP/1.1 405 Method Not Allowed\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+      writer.close()
+      return
+
+    writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream; charset=utf-8\r\nCache-Control: no-cache\r\nAccess-Control-Allow-Origin: *\r\nConnection: keep-alive\r\n\r\n')
+    subscriber = hub.subscribe(path.strip('/') or None)
+    task = asyncio.ensure_future(send(subscriber, writer, lambda message: f'event: cue\ndata: {message}\n\n'.encode('utf-8')))
+    await wait_closed(reader)
+    task.cancel()
+    hub.unsubscribe(subscriber)
+    writer.close()
+
+  return await asyncio.start_server(connected, url.hostname, url.port, limit=LINE_LIMIT)
+
+async def serve(args):
+  hub = Hub(args.queue_size)
+  servers = []
+  for name, url in args.input:
+    servers.append(await open_input(name, url, hub, args.SID, args.all))
+  for url in args.json:
+    servers.append(await open_json(url, hub))
+  for url in args.sse:
+    servers.append(await open_sse(url, hub))
+
+  try:
+    await asyncio.Event().wait()
+  finally:
+    for server in servers:
+      server.close()
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description=('ARIB subtitle server'))
+
+  parser.add_argument('-i', '--input', type=parse_input, action='append', required=True)
+  parser.add_argument('-s', '--SID', type=int, action='append')
+  parser.add_argument('-a', '--all', action='store_true')
+  parser.add_argument('-j', '--json', type=urlsplit, action='append', default=[])
+  parser.add_argument('-e', '--sse', type=lambda value: urlsplit(f'//{value}'), action='append', default=[])
+  parser.add_argument('-q', '--queue-size', type=int, default=Hub.QUEUE_SIZE)
+
+  args = parser.parse_args()
+
+  logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s')
+  try:
+    asyncio.run(serve(args))
+  except KeyboardInterrupt:
+    pass
@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+
+def make_CRC32_table(polynomial = 0x04c11db7):
+  table = []
+  for byte in range(256):
+    crc = byte << 24
+    for _ in range(8):
+      crc = ((crc << 1) ^ polynomial) if crc & 0x80000000 else (crc << 1)
+      crc &= 0xFFFFFFFF
+    table.append(crc)
+  return tuple(table)
+
+CRC32_TABLE = make_CRC32_table()
+
+def CRC32(data, crc = 0xFFFFFFFF):
+  table = CRC32_TABLE
+  for byte in data:
+    crc = ((crc << 8) & 0xFFFFFFFF) ^ table[(crc >> 24) ^ byte]
+  return crc
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+
+try:
+  import numpy
+except ImportError: # numpy が無い場合は Python で PID を見る
+  numpy = None
+
+from mpeg2ts.packet import Packet, PacketView
+
+class PIDFilter:
+
+  def __init__(self, reader, pids = ()):
+    self.reader = reader
+    self.pids = set(pids)
+
+  def __iter__(self):
+    for buffer, begin, end in self.reader.blocks():
+      yield from self.packets(buffer, begin, end)
+
+  def feed(self, data, last = False):
+    # MEMO: PushPacketReader の場合はこちらで受け取った bytes を渡す
+    for buffer, begin, end in self.reader.feed(data, last):
+      yield from self.packets(buffer, begin, end)
+
+  def packets(self, buffer, begin, end):
+    if numpy is not None:
+      return self.filter_vectorized(buffer, begin, end)
+    else:
+      return self.filter(buffer, begin, end)
+
+  def filter(self, buffer, begin, end):
+    for offset in range(begin, end, self.reader.packet_size):
+      if (((buffer[offset + 1] & 0x1F) << 8) | buffer[offset + 2]) in self.pids:
+        yield PacketView(buffer, offset)
+
+  def filter_vectorized(self, buffer, begin, end):
+    stride = self.reader.packet_size
+    count = (end - begin + stride - 1) // stride
+    data = numpy.frombuffer(buffer, dtype=numpy.uint8, count=(count - 1) * stride + Packet.PACKET_SIZE, offset=begin)
+    table = numpy.lib.stride_tricks.as_strided(data, shape=(count, Packet.PACKET_SIZE), strides=(stride, 1), writeable=False)
+    pids = ((table[:, 1].astype(numpy.uint16) & 0x1F) << 8) | table[:, 2]
+
+    index = 0
+    while index < len(pids):
+      wanted = frozenset(self.pids)
+      hits = numpy.flatnonzero(numpy.isin(pids[index:], numpy.fromiter(wanted, dtype=numpy.int64, count=len(wanted)))) + index
+      index = len(pids)
+
+      for hit in hits.tolist():
+        yield PacketView(buffer, begin + hit * stride)
+        if self.pids != wanted: # PAT/PMT の更新で対象の PID が変わったので、残りを選び直す
+          index = hit + 1
+          break
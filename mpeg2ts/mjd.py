@@ -1,3 +1,7 @@
+from datetime import datetime, timedelta, timezone
+
+JST = timezone(timedelta(hours=9), 'JST')
+
 def BCD(byte):
   return (((byte & 0xF0) >> 4) * 10) + (byte & 0x0F)
 
@@ -17,3 +21,13 @@ def YMD_to_MJD(Y, M, D):
   d = D - 1
   n = d + (153 * m + 2) // 5 + (365 * y) + (y // 4) - (y // 100) + (y // 400)
   return n - 678881
+
+def JST_time(data, begin):
+  # MEMO: MJD (16bit) + 時分秒の BCD (24bit), 未定義 (全て 1) の場合は None
+  MJD = (data[begin + 0] << 8) | data[begin + 1]
+  if MJD == 0xFFFF: return None
+  year, month, day = MJD_to_YMD(MJD)
+  try:
+    return datetime(year, month, day, BCD(data[begin + 2]), BCD(data[begin + 3]), BCD(data[begin + 4]), tzinfo=JST)
+  except ValueError: # 壊れた BCD
+    return None
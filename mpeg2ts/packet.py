@@ -15,6 +15,9 @@ class Packet:
   def __setitem__(self, key, value):
     self.packet[key] = value
 
+  def view(self, begin = 0, end = PACKET_SIZE):
+    return memoryview(self.packet)[begin:end]
+
   def transport_error_indicator(self):
     return (self.packet[1] & 0x80) != 0
 
@@ -42,6 +45,9 @@ class Packet:
   def pointer_field(self):
     return self.packet[Packet.HEADER_SIZE + (1 + self.adaptation_field_length() if self.has_adaptation_field() else 0)]
 
+  def discontinuity_indicator(self):
+    return self.adaptation_field_length() > 0 and (self.packet[Packet.HEADER_SIZE + 1] & 0x80) != 0
+
   def has_pcr(self):
     return self.has_adaptation_field() and (self.packet[Packet.HEADER_SIZE + 1] & 0x10) != 0
 
@@ -55,3 +61,74 @@ class Packet:
     pcr_base = (pcr_base << 8) | ((self.packet[Packet.HEADER_SIZE + 1 + 4] & 0xFF) >> 0)
     pcr_base = (pcr_base << 1) | ((self.packet[Packet.HEADER_SIZE + 1 + 5] & 0x80) >> 7)
     return pcr_base
+
+class PacketView(Packet):
+
+  def __init__(self, buffer, offset = 0):
+    self.buffer = buffer
+    self.offset = offset
+
+  @property
+  def packet(self):
+    return self.buffer[self.offset:self.offset + Packet.PACKET_SIZE]
+
+  def __getitem__(self, item):
+    if isinstance(item, slice):
+      begin, end, step = item.indices(Packet.PACKET_SIZE)
+      return self.buffer[self.offset + begin:self.offset + end:step]
+    return self.buffer[self.offset + item]
+
+  def __setitem__(self, key, value):
+    if isinstance(key, slice):
+      begin, end, step = key.indices(Packet.PACKET_SIZE)
+      self.buffer[self.offset + begin:self.offset + end:step] = value
+    else:
+      self.buffer[self.offset + key] = value
+
+  def view(self, begin = 0, end = Packet.PACKET_SIZE):
+    return memoryview(self.buffer)[self.offset + begin:self.offset + end]
+
+  def transport_error_indicator(self):
+    return (self.buffer[self.offset + 1] & 0x80) != 0
+
+  def payload_unit_start_indicator(self):
+    return (self.buffer[self.offset + 1] & 0x40) != 0
+
+  def transport_priority(self):
+    return (self.buffer[self.offset + 1] & 0x20) != 0
+
+  def pid(self):
+    return ((self.buffer[self.offset + 1] & 0x1F) << 8) | self.buffer[self.offset + 2]
+
+  def has_adaptation_field(self):
+    return (self.buffer[self.offset + 3] & 0x20) != 0
+
+  def has_payload(self):
+    return (self.buffer[self.offset + 3] & 0x10) != 0
+
+  def continuity_counter(self):
+    return self.buffer[self.offset + 3] & 0x0F
+
+  def adaptation_field_length(self):
+    return self.buffer[self.offset + 4] if self.has_adaptation_field() else 0
+
+  def pointer_field(self):
+    return self.buffer[self.offset + Packet.HEADER_SIZE + (1 + self.adaptation_field_length() if self.has_adaptation_field() else 0)]
+
+  def discontinuity_indicator(self):
+    return self.adaptation_field_length() > 0 and (self.buffer[self.offset + Packet.HEADER_SIZE + 1] & 0x80) != 0
+
+  def has_pcr(self):
+    return self.has_adaptation_field() and (self.buffer[self.offset + Packet.HEADER_SIZE + 1] & 0x10) != 0
+
+  def pcr(self):
+    if not self.has_pcr(): return None
+
+    begin = self.offset + Packet.HEADER_SIZE + 1
+    pcr_base = 0
+    pcr_base = (pcr_base << 8) | ((self.buffer[begin + 1] & 0xFF) >> 0)
+    pcr_base = (pcr_base << 8) | ((self.buffer[begin + 2] & 0xFF) >> 0)
+    pcr_base = (pcr_base << 8) | ((self.buffer[begin + 3] & 0xFF) >> 0)
+    pcr_base = (pcr_base << 8) | ((self.buffer[begin + 4] & 0xFF) >> 0)
+    pcr_base = (pcr_base << 1) | ((self.buffer[begin + 5] & 0x80) >> 7)
+    return pcr_base
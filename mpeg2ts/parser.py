@@ -14,33 +14,24 @@ class SectionParser:
 
   def push(self, packet):
     begin = Packet.HEADER_SIZE + (1 + packet.adaptation_field_length() if packet.has_adaptation_field() else 0)
-    if packet.payload_unit_start_indicator(): begin += 1
-
-    if not self.section:
-      if packet.payload_unit_start_indicator():
-        begin += packet.pointer_field()
-      else:
-        return
-
     if packet.payload_unit_start_indicator():
-      while begin < Packet.PACKET_SIZE:
+      begin += 1 + (0 if self.section else packet.pointer_field())
+    elif not self.section:
+      return
+
+    while begin < Packet.PACKET_SIZE:
+      if not self.section:
+        if not packet.payload_unit_start_indicator(): break
         if packet[begin] == Packet.STUFFING_BYTE[0]: break
-        if self.section:
-          next = min(begin + self.section.remains(), Packet.PACKET_SIZE)
-        else:
+        if begin + 3 <= Packet.PACKET_SIZE:
           section_length = ((packet[begin + 1] & 0x0F) << 8) | packet[begin + 2]
-          next = min(begin + (3 + section_length), Packet.PACKET_SIZE)
-          self.section = Section()
-        self.section += packet[begin:next]
-
-        if self.section.fulfilled():
-          self.queue.append(self.section)
-          self.section = None
+          self.section = Section(size = 3 + section_length)
+        else:
+          self.section = Section() # section_length が次の packet にまたがっている
 
-        begin = next
-    else:
       next = min(begin + self.section.remains(), Packet.PACKET_SIZE)
-      self.section += packet[begin:next]
+      self.section += packet.view(begin, next)
+      begin = next
 
       if self.section.fulfilled():
         self.queue.append(self.section)
@@ -53,30 +44,50 @@ class SectionParser:
     return self.queue.popleft()
 
 class PESParser:
+  MAX_SIZE = 1 << 20
+  POOL_SIZE = 4
 
-  def __init__(self):
+  def __init__(self, max_size = MAX_SIZE, pool_size = POOL_SIZE):
     self.pes = None
     self.queue = deque()
+    self.pool = []
+    self.max_size = max_size
+    self.pool_size = pool_size
 
   def push(self, packet):
     begin = Packet.HEADER_SIZE + (1 + packet.adaptation_field_length() if packet.has_adaptation_field() else 0)
     if not packet.payload_unit_start_indicator() and not self.pes: return
 
     if packet.payload_unit_start_indicator():
-      if self.pes and self.pes.packet_length() == 0:
+      # MEMO: header (6byte) も揃っていない PES は PES_packet_length を読めない (使い回しの buffer だと前の PES の値が見える) ので捨てる
+      if self.pes is not None and len(self.pes) >= PES.HEADER_SIZE and self.pes.PES_packet_length() == 0:
         self.queue.append(self.pes)
+      elif self.pes is not None: # 途中で途切れた PES は捨てる
+        self.release(self.pes)
+
+      self.pes = PES(buffer = self.pool.pop() if self.pool else None)
+      if begin + PES.HEADER_SIZE <= Packet.PACKET_SIZE:
+        pes_length = (packet[begin + 4] << 8) | packet[begin + 5]
+        if pes_length != 0: self.pes.reserve(PES.HEADER_SIZE + pes_length)
 
-      pes_length = (packet[begin + 3] << 16) | (packet[begin + 4] << 8) | packet[begin + 5]
-      next = min(begin + (PES.HEADER_SIZE + pes_length), Packet.PACKET_SIZE)
-      self.pes = PES(packet[begin:next])
-    else:
+    while begin < Packet.PACKET_SIZE and not self.pes.fulfilled():
       next = min(begin + self.pes.remains(), Packet.PACKET_SIZE)
-      self.pes += packet[begin:next]
+      self.pes += packet.view(begin, next)
+      begin = next
 
-    if self.pes.fulfilled():
+    if len(self.pes) > self.max_size: # 壊れたストリームでメモリを使い果たさないように捨てる
+      self.release(self.pes)
+      self.pes = None
+    elif self.pes.fulfilled():
       self.queue.append(self.pes)
       self.pes = None
 
+  def release(self, pes):
+    # MEMO: 使い終わった PES の buffer を次の PES で使い回す (release した PES は以降使わないこと)
+    if len(self.pool) < self.pool_size and len(pes.payload) <= self.max_size:
+      self.pool.append(pes.payload)
+    pes.payload = None
+
   def empty(self):
     return not self.queue
 
@@ -5,11 +5,16 @@ import math
 class PES:
   HEADER_SIZE = 6
 
-  def __init__(self, payload = b''):
-    self.payload = bytearray(payload)
+  def __init__(self, payload = b'', buffer = None):
+    # MEMO: buffer には使い回しの bytearray を渡せる (length より後ろは前の PES の残りなので見ないこと)
+    self.payload = buffer if buffer is not None else bytearray()
+    self.length = 0
+    self += payload
 
   def __iadd__(self, payload):
-    self.payload += payload
+    end = self.length + len(payload)
+    self.payload[self.length:end] = payload
+    self.length = end
     return self
 
   def __getitem__(self, item):
@@ -19,7 +24,11 @@ class PES:
     self.payload[key] = value
 
   def __len__(self):
-    return len(self.payload)
+    return self.length
+
+  def reserve(self, size):
+    if len(self.payload) < size:
+      self.payload += bytes(size - len(self.payload))
 
   def packet_start_code_prefix(self):
     return (self.payload[0] << 16) | (self.payload[1] << 8) | self.payload[2]
@@ -31,13 +40,17 @@ class PES:
     return (self.payload[4] << 8) | self.payload[5]
 
   def remains(self):
-    if self.PES_packet_length() == 0:
+    if self.length < PES.HEADER_SIZE:
+      return PES.HEADER_SIZE - self.length
+    elif self.PES_packet_length() == 0:
       return math.inf
     else:
-      return max(0, (PES.HEADER_SIZE + self.PES_packet_length()) - len(self.payload))
+      return max(0, (PES.HEADER_SIZE + self.PES_packet_length()) - self.length)
 
   def fulfilled(self):
-    if self.PES_packet_length() == 0:
-      return false
+    if self.length < PES.HEADER_SIZE:
+      return False
+    elif self.PES_packet_length() == 0:
+      return False
     else:
-      return len(self.payload) >= PES.HEADER_SIZE + self.PES_packet_length()
+      return self.length >= PES.HEADER_SIZE + self.PES_packet_length()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+
+from mpeg2ts.section import Section
+from mpeg2ts.parser import SectionParser, PESParser
+from mpeg2ts.psi import PSICache
+from mpeg2ts.demux import PIDFilter
+from mpeg2ts.timeline import Timeline
+from mpeg2ts.mjd import JST_time
+
+class Program:
+
+  def __init__(self, program_number, PMT_PID):
+    self.program_number = program_number
+    self.PMT_PID = PMT_PID
+    self.PCR_PID = -1
+    self.SUBTITLE_PID = -1
+    self.timeline = Timeline()
+
+class ProgramDemuxer:
+
+  def __init__(self, reader, SIDs = None, select_all = False, clock = False):
+    self.filter = PIDFilter(reader, [0x00, 0x14])
+    self.SIDs = None if SIDs is None else set(SIDs)
+    self.select_all = select_all
+    self.clock = clock # MEMO: True なら PCR を受け取る度に (programs, None) も yield する (字幕が無い間も時刻を進めたい場合)
+    self.programs = dict()
+    self.retired = dict() # PAT から外れた番組 (戻ってきた場合に時刻を引き継ぐ)
+
+    self.PAT_Parser = SectionParser()
+    self.TOT_Parser = SectionParser()
+    self.PMT_Parsers = dict()
+    self.SUBTITLE_Parsers = dict()
+    self.PSI_Cache = PSICache()
+
+  def __iter__(self):
+    for ts in self.filter:
+      yield from self.push(ts)
+
+  def feed(self, data, last = False):
+    # MEMO: PushPacketReader を渡した場合に使う (asyncio などで受け取った分ずつ処理する)
+    for ts in self.filter.feed(data, last):
+      yield from self.push(ts)
+
+  def push(self, ts):
+    pid = ts.pid()
+
+    if pid == 0x00:
+      self.push_PAT(ts)
+    elif pid == 0x14:
+      self.push_TOT(ts)
+    elif pid in self.PMT_Parsers:
+      self.push_PMT(pid, ts)
+    else:
+      PCR = ts.pcr()
+      if PCR is not None:
+        clocked = [program for program in self.programs.values() if program.PCR_PID == pid]
+        discontinuity = ts.discontinuity_indicator()
+        for program in clocked:
+          program.timeline.push(PCR, discontinuity)
+        if self.clock and clocked:
+          yield clocked, None
+
+    if pid in self.SUBTITLE_Parsers:
+      parser = self.SUBTITLE_Parsers[pid]
+      parser.push(ts)
+      while not parser.empty():
+        pes = parser.pop()
+        # MEMO: 同じ字幕 PID を共有する番組には一度だけ渡す
+        yield [program for program in self.programs.values() if program.SUBTITLE_PID == pid], pes
+        parser.release(pes)
+
+  def push_PAT(self, ts):
+    self.PAT_Parser.push(ts)
+    while not self.PAT_Parser.empty():
+      PAT = self.PAT_Parser.pop()
+      if not self.PSI_Cache.update(0x00, PAT): continue
+
+      entries = []
+      begin = Section.HEADER_SIZE
+      while begin < 3 + PAT.section_length() - Section.CRC_SIZE:
+        program_number = (PAT[begin + 0] << 8) | PAT[begin + 1]
+        program_map_PID = ((PAT[begin + 2] & 0x1F) << 8) | PAT[begin + 3]
+
+        if program_number != 0x00: # 0 は network_PID (NIT) なので番組ではない
+          entries.append((program_number, program_map_PID))
+
+        begin += 4
+
+      if self.SIDs is None and not self.select_all: # 指定が無ければ最初の番組だけ取る
+        self.SIDs = {program_number for program_number, _ in entries[:1]}
+
+      programs = dict()
+      for program_number, program_map_PID in entries:
+        if not self.select_all and program_number not in self.SIDs: continue
+
+        program = self.programs.get(program_number)
+        if program is None or program.PMT_PID != program_map_PID:
+          # MEMO: PMT_PID が変わっただけなら同じ番組なので、media time が 0 に戻らないよう timeline は引き継ぐ
+          previous = program
+          retired = self.retired.pop(program_number, None)
+          program = Program(program_number, program_map_PID)
+          if previous is not None:
+            program.timeline = previous.timeline
+          elif retired is not None:
+            program.timeline = retired.timeline
+            program.timeline.resume()
+          # MEMO: 一度 PAT から外れて戻ってきた番組 (臨時サービスなど) は PMT が変わっていないと PSI_Cache で弾かれるので、保持している PMT を使う
+          PMT = self.PSI_Cache.get(program_map_PID, 0x02, program_number)
+          if PMT is not None: self.apply_PMT(program, PMT)
+        programs[program_number] = program
+
+      self.retired.update({program_number: program for program_number, program in self.programs.items() if program_number not in programs})
+      self.programs = programs
+      self.update()
+
+  def push_TOT(self, ts):
+    self.TOT_Parser.push(ts)
+    while not self.TOT_Parser.empty():
+      TOT = self.TOT_Parser.pop()
+      if TOT.table_id() != 0x70 and TOT.table_id() != 0x73: continue # TDT, TOT
+      if len(TOT) < 3 + 5: continue
+      if TOT.table_id() == 0x73 and TOT.CRC32() != 0: continue
+
+      # MEMO: 直前の PCR の時刻と結び付けて、各番組の PTS を JST の時刻に直せるようにする
+      time = JST_time(TOT, 3)
+      if time is None: continue
+      for program in self.programs.values():
+        if not program.timeline.empty(): program.timeline.synchronize(time)
+
+  def push_PMT(self, pid, ts):
+    parser = self.PMT_Parsers[pid]
+    parser.push(ts)
+    while not parser.empty():
+      PMT = parser.pop()
+      if PMT.table_id() != 0x02: continue
+      program = self.programs.get(PMT.table_id_extension())
+      if program is None or program.PMT_PID != pid: continue
+      if not self.PSI_Cache.update(pid, PMT): continue
+
+      self.apply_PMT(program, PMT)
+      self.update()
+
+  def apply_PMT(self, program, PMT):
+    program.PCR_PID = ((PMT[Section.HEADER_SIZE + 0] & 0x1F) << 8) | PMT[Section.HEADER_SIZE + 1]
+    program_info_length = ((PMT[Section.HEADER_SIZE + 2] & 0x0F) << 8) | PMT[Section.HEADER_SIZE + 3]
+
+    begin = Section.HEADER_SIZE + 4 + program_info_length
+    while begin < 3 + PMT.section_length() - Section.CRC_SIZE:
+      stream_type = PMT[begin + 0]
+      elementary_PID = ((PMT[begin + 1] & 0x1F) << 8) | PMT[begin + 2]
+      ES_info_length = ((PMT[begin + 3] & 0x0F) << 8) | PMT[begin + 4]
+
+      descriptor = begin + 5
+      while descriptor < (begin + 5 + ES_info_length):
+        descriptor_tag = PMT[descriptor + 0]
+        descriptor_length = PMT[descriptor + 1]
+        if descriptor_tag == 0x52:
+          component_tag = PMT[descriptor + 2]
+          if stream_type == 0x06:
+            program.SUBTITLE_PID = elementary_PID
+        descriptor += 2 + descriptor_length
+
+      begin += 5 + ES_info_length
+
+  def update(self):
+    PMT_PIDs = {program.PMT_PID for program in self.programs.values()}
+    SUBTITLE_PIDs = {program.SUBTITLE_PID for program in self.programs.values() if program.SUBTITLE_PID >= 0}
+
+    self.PMT_Parsers = {pid: self.PMT_Parsers.get(pid) or SectionParser() for pid in PMT_PIDs}
+    self.SUBTITLE_Parsers = {pid: self.SUBTITLE_Parsers.get(pid) or PESParser() for pid in SUBTITLE_PIDs}
+
+    pids = {0x00, 0x14} | PMT_PIDs | SUBTITLE_PIDs
+    pids |= {program.PCR_PID for program in self.programs.values() if program.PCR_PID >= 0}
+    self.filter.pids = pids
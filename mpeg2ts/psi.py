@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+
+class PSICache:
+
+  def __init__(self):
+    self.sections = dict()
+    self.listeners = []
+
+  def listen(self, listener):
+    self.listeners.append(listener)
+
+  def update(self, pid, section):
+    if not section.current_next_indicator(): return False # 次に有効になる table はまだ使わない
+
+    key = (pid, section.table_id(), section.table_id_extension(), section.section_number())
+    cached = self.sections.get(key)
+    if cached is not None and cached.version_number() == section.version_number() and cached.payload == section.payload:
+      return False # 同じ内容の再送なので CRC も中身も見ない
+    if section.CRC32() != 0: return False
+
+    self.sections[key] = section
+    for listener in self.listeners:
+      listener(pid, section)
+    return True
+
+  def get(self, pid, table_id, table_id_extension, section_number = 0):
+    return self.sections.get((pid, table_id, table_id_extension, section_number))
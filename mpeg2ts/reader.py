@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+import io
+import os
+import stat
+import mmap
+
+from mpeg2ts.packet import Packet, PacketView
+
+PACKET_SIZES = (
+  188, # TS
+  192, # BDAV (M2TS): 4byte の TP_extra_header が前に付く
+  204, # 16byte の RS 符号が後ろに付く
+)
+PROBE_PACKETS = 8
+PROBE_SIZE = max(PACKET_SIZES) * (PROBE_PACKETS + 1)
+
+def probe_packet_size(buffer, begin, end):
+  for size in PACKET_SIZES:
+    offset = buffer.find(Packet.SYNC_BYTE, begin, min(end, begin + size))
+    while offset >= 0:
+      count = min(PROBE_PACKETS, (end - offset - Packet.PACKET_SIZE) // size + 1)
+      if count > 1 and buffer[offset:offset + count * size:size] == Packet.SYNC_BYTE * count:
+        return size
+      offset = buffer.find(Packet.SYNC_BYTE, offset + 1, min(end, begin + size))
+  return Packet.PACKET_SIZE
+
+class PacketReader:
+  BUFFER_SIZE = Packet.PACKET_SIZE * 4096
+
+  def __init__(self, reader, buffer_size = BUFFER_SIZE, packet_size = None):
+    self.reader = reader
+    # MEMO: readinto は buffer が埋まるまで待つので、pipe などで届いた分だけ先に処理できるように readinto1 を使う
+    self.readinto = getattr(reader, 'readinto1', reader.readinto)
+    self.buffer = bytearray(max(buffer_size, PROBE_SIZE))
+    self.packet_size = packet_size
+    self.block_packets = len(self.buffer) // Packet.PACKET_SIZE
+
+  def __iter__(self):
+    for buffer, begin, end in self.blocks():
+      for offset in range(begin, end, self.packet_size):
+        yield PacketView(buffer, offset)
+
+  def blocks(self):
+    # MEMO: yield した buffer (と PacketView) は次の読み込みで上書きされるので、呼び出し側は次の block を要求する前に使い終えること
+    buffer = self.buffer
+    view = memoryview(buffer)
+    begin, end = 0, 0
+
+    while True:
+      remains = end - begin
+      buffer[0:remains] = buffer[begin:end]
+      begin, end = 0, remains
+
+      size = self.readinto(view[end:])
+      if not size:
+        if self.packet_size is None: self.packet_size = probe_packet_size(buffer, begin, end)
+        yield from self.synchronize(buffer, begin, end, True)
+        return
+      end += size
+
+      if self.packet_size is None:
+        if end - begin < PROBE_SIZE: continue
+        self.packet_size = probe_packet_size(buffer, begin, end)
+      begin = yield from self.synchronize(buffer, begin, end)
+
+  def synchronize(self, buffer, begin, end, last = False):
+    # MEMO: 192/204 byte の場合も SYNC_BYTE の位置を起点に packet_size 毎に進み、前後の余分な byte は読み飛ばす
+    while end - begin >= (Packet.PACKET_SIZE if last else self.packet_size):
+      if buffer[begin] != Packet.SYNC_BYTE[0]:
+        sync = buffer.find(Packet.SYNC_BYTE, begin + 1, end)
+        begin = sync if sync >= 0 else end
+        continue
+
+      count = min((end - begin) // self.packet_size, self.block_packets)
+      if last and count < self.block_packets and (end - begin) % self.packet_size >= Packet.PACKET_SIZE:
+        count += 1 # 末尾の packet は後ろの余分な byte が欠けていても良い
+      syncs = buffer[begin:begin + count * self.packet_size:self.packet_size]
+      synced = count - len(syncs.lstrip(Packet.SYNC_BYTE))
+
+      yield buffer, begin, begin + synced * self.packet_size
+      begin += synced * self.packet_size
+      if synced < count: begin += 1 # 同期が外れたので次の SYNC_BYTE を探す
+
+    return begin
+
+class MappedPacketReader(PacketReader):
+
+  def __init__(self, reader, buffer_size = PacketReader.BUFFER_SIZE, packet_size = None):
+    self.reader = reader
+    self.packet_size = packet_size
+    self.block_packets = max(buffer_size, Packet.PACKET_SIZE) // Packet.PACKET_SIZE
+    self.mapped = mmap.mmap(reader.fileno(), 0, access=mmap.ACCESS_READ)
+
+  def blocks(self):
+    # MEMO: ファイル全体を map しているので、上書きされる事はなく PacketView はそのまま使い続けられる
+    begin, end = self.reader.tell(), len(self.mapped)
+    if self.packet_size is None:
+      self.packet_size = probe_packet_size(self.mapped, begin, min(end, begin + PROBE_SIZE))
+    yield from self.synchronize(self.mapped, begin, end, True)
+
+class PushPacketReader(PacketReader):
+  # MEMO: socket などから受け取った bytes を feed で渡していく reader (blocks の代わりに feed が block を yield する)
+
+  def __init__(self, buffer_size = PacketReader.BUFFER_SIZE, packet_size = None):
+    self.buffer = bytearray(max(buffer_size, PROBE_SIZE))
+    self.packet_size = packet_size
+    self.block_packets = len(self.buffer) // Packet.PACKET_SIZE
+    self.begin, self.end = 0, 0
+
+  def feed(self, data, last = False):
+    # MEMO: yield した buffer は次の feed で上書きされるので、呼び出し側は feed を最後まで回してから次を渡すこと
+    buffer = self.buffer
+    data = memoryview(data)
+
+    while True:
+      remains = self.end - self.begin
+      buffer[0:remains] = buffer[self.begin:self.end]
+      self.begin, self.end = 0, remains
+
+      size = min(len(buffer) - self.end, len(data))
+      buffer[self.end:self.end + size] = data[:size]
+      data = data[size:]
+      self.end += size
+
+      if self.packet_size is None:
+        if self.end - self.begin < PROBE_SIZE and not last: return
+        self.packet_size = probe_packet_size(buffer, self.begin, self.end)
+      self.begin = yield from self.synchronize(buffer, self.begin, self.end, last and not data)
+      if not data: return
+
+def open_reader(reader, buffer_size = PacketReader.BUFFER_SIZE, packet_size = None):
+  try:
+    if stat.S_ISREG(os.fstat(reader.fileno()).st_mode):
+      return MappedPacketReader(reader, buffer_size, packet_size)
+  except (OSError, ValueError, io.UnsupportedOperation): # 空ファイルや fileno を持たない stream
+    pass
+  return PacketReader(reader, buffer_size, packet_size)
@@ -1,14 +1,28 @@
 #!/usr/bin/env python3
 
+from mpeg2ts.crc import CRC32
+
 class Section:
   HEADER_SIZE = 8
   CRC_SIZE = 4
 
-  def __init__(self, payload = b''):
-    self.payload = bytearray(payload)
+  def __init__(self, payload = b'', size = 0):
+    # MEMO: size (3 + section_length) が分かっていれば最初に確保して、以降は埋めるだけにする
+    self.payload = bytearray(max(size, len(payload)))
+    self.payload[0:len(payload)] = payload
+    self.length = len(payload)
+    self.crc = 0xFFFFFFFF
+    self.crc_length = 0 # MEMO: crc に反映済みの byte 数
 
   def __iadd__(self, payload):
-    self.payload += payload
+    end = self.length + len(payload)
+    if end > len(self.payload):
+      self.payload += bytes(end - len(self.payload))
+    self.payload[self.length:end] = payload
+    self.length = end
+
+    if self.length >= 3 and len(self.payload) < 3 + self.section_length(): # section_length が packet をまたいでいた場合
+      self.payload += bytes(3 + self.section_length() - len(self.payload))
     return self
 
   def __getitem__(self, item):
@@ -16,9 +30,10 @@ class Section:
 
   def __setitem__(self, key, value):
     self.payload[key] = value
+    self.crc, self.crc_length = 0xFFFFFFFF, 0
 
   def __len__(self):
-    return len(self.payload)
+    return self.length
 
   def table_id(self):
     return self.payload[0]
@@ -42,19 +57,15 @@ class Section:
     return self.payload[7]
 
   def remains(self):
-    return max(0, (3 + self.section_length()) - len(self.payload))
+    if self.length < 3: return 3 - self.length
+    return max(0, (3 + self.section_length()) - self.length)
 
   def fulfilled(self):
-    return len(self.payload) >= 3 + self.section_length()
+    return self.length >= 3 and self.length >= 3 + self.section_length()
 
   def CRC32(self):
-    crc = 0xFFFFFFFF
-    for byte in self.payload:
-      for index in range(7, -1, -1):
-        bit = (byte & (1 << index)) >> index
-        c = 1 if crc & 0x80000000 else 0
-        crc <<= 1
-        if c ^ bit: crc ^= 0x04c11db7
-        crc &= 0xFFFFFFFF
-    return crc
-
+    # MEMO: 追加された分だけ計算を進める
+    if self.crc_length < self.length:
+      self.crc = CRC32(memoryview(self.payload)[self.crc_length:self.length], self.crc)
+      self.crc_length = self.length
+    return self.crc
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+from datetime import datetime
+
+from mpeg2ts.mjd import JST
+
+class Timeline:
+  # MEMO: PCR を追いかけて、33bit で一周する PTS を先頭の PCR からの単調増加する時刻 (90kHz) に直す
+  # MEMO: discontinuity_indicator が立った場合や PCR が大きく飛んだ場合 (番組の切り替え, 録画の連結など) は、直前の PCR の間隔だけ進んだものとして繋ぐ
+  WRAP = 1 << 33
+  HZ = 90000
+  MAX_GAP = HZ * 10 # これより PCR が進んだ (戻った) 場合は不連続とみなす
+  INTERVAL = HZ // 10 # PCR の送出間隔 (100ms 以内) が分からない場合の仮の値
+
+  def __init__(self):
+    self.PCR = None # 最後の PCR (33bit のまま)
+    self.time = 0 # 最後の PCR の時刻
+    self.interval = Timeline.INTERVAL
+    self.discontinuities = 0
+    self.resumed = False
+    self.offset = None # TOT/TDT から求めた (media_time 0 の) UNIX 時刻の範囲 [lower, upper)
+
+  def empty(self):
+    return self.PCR is None
+
+  def push(self, PCR, discontinuity = False):
+    if self.PCR is None:
+      self.PCR = PCR
+      return
+
+    delta = (PCR - self.PCR) % Timeline.WRAP # 一周した場合もここで繋がる
+    resumed, self.resumed = self.resumed, False
+    if resumed and not discontinuity and delta < Timeline.WRAP // 2:
+      pass # PCR を見ていなかった間の分だけ進める
+    elif discontinuity or delta > Timeline.MAX_GAP:
+      self.discontinuities += 1
+      delta = self.interval
+    elif delta > 0:
+      self.interval = delta
+    self.time += delta
+    self.PCR = PCR
+
+  def resume(self):
+    # MEMO: 番組が PAT から外れていた間は PCR を見ていないので、次の PCR までの間隔は不連続とみなさない
+    self.resumed = True
+
+  def media_time(self, PTS):
+    # MEMO: PTS は最後の PCR の前後 (2^32 以内) にあるものとして符号付きの差を取る
+    diff = (PTS - self.PCR) % Timeline.WRAP
+    if diff >= Timeline.WRAP // 2: diff -= Timeline.WRAP
+    return max(0, self.time + diff)
+
+  def seconds(self, PTS):
+    return self.media_time(PTS) / Timeline.HZ
+
+  def synchronize(self, time):
+    # MEMO: TOT/TDT は秒までなので、一つでは 1 秒の幅がある, 矛盾しない間は幅を狭めていき、矛盾したら (時計の修正や不連続) 取り直す
+    lower = time.timestamp() - self.time / Timeline.HZ
+    upper = lower + 1
+    if self.offset is not None and lower < self.offset[1] and self.offset[0] < upper:
+      self.offset = (max(lower, self.offset[0]), min(upper, self.offset[1]))
+    else:
+      self.offset = (lower, upper)
+
+  def datetime(self, PTS):
+    if self.offset is None: return None
+    return datetime.fromtimestamp((self.offset[0] + self.offset[1]) / 2 + self.seconds(PTS), JST)
+
+  def PTS(self, media_time):
+    # MEMO: media_time に対応する (今の時刻系での) 33bit の PTS, HLS の X-TIMESTAMP-MAP などに使う
+    return (self.PCR + (media_time - self.time)) % Timeline.WRAP
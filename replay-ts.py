@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+
+import argparse
+import socket
+import sys
+import time
+from urllib.parse import urlsplit
+
+from mpeg2ts.packet import Packet
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description=('TS replay sender'))
+
+  parser.add_argument('output', type=urlsplit) # udp://host:port, tcp://host:port, unix:///path
+  parser.add_argument('-i', '--input', type=argparse.FileType('rb'), nargs='?', default=sys.stdin.buffer)
+  parser.add_argument('-b', '--bitrate', type=float, default=0) # bps, 0 なら待たずに送る
+  parser.add_argument('-l', '--loop', action='store_true')
+
+  args = parser.parse_args()
+
+  # MEMO: UDP は 1 datagram に 7 packet (1316 byte) ずつ詰めて送る
+  chunk_size = Packet.PACKET_SIZE * 7
+  if args.output.scheme == 'udp':
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
+    sock.connect((args.output.hostname, args.output.port))
+  elif args.output.scheme == 'tcp':
+    sock = socket.create_connection((args.output.hostname, args.output.port))
+  else:
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(args.output.path)
+
+  sent, begin = 0, time.monotonic()
+  while True:
+    chunk = args.input.read(chunk_size)
+    if not chunk:
+      if not args.loop or not args.input.seekable(): break
+      args.input.seek(0)
+      continue
+
+    sock.send(chunk) if args.output.scheme == 'udp' else sock.sendall(chunk)
+    sent += len(chunk)
+    if args.bitrate > 0:
+      wait = begin + sent * 8 / args.bitrate - time.monotonic()
+      if wait > 0: time.sleep(wait)
+
+  sock.close()
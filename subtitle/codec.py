@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+
+import codecs
+
+from subtitle.JIS8 import JIS8, ESC, G_SET, G_DRCS
+from subtitle.dictionary import Dictionary, CodeTable, HIRAGANA, KATAKANA, ALNUM, KANJI, MACRO, JIS_X0201_KATAKANA, JIS_X0213_2004_KANJI_1, JIS_X0213_2004_KANJI_2, ADDITIONAL_SYMBOLS
+
+NAME = 'arib-std-b24'
+DRCS = 0x100 # MEMO: DRCS の終端符号は文字集合と重なるので、この bit を立てて区別する
+
+HALFWIDTH = str.maketrans({ chr(ch): chr(ch - 0xFEE0) for ch in range(0xFF01, 0xFF5F) }) # MSZ (中型) の英数は半角にする
+HALFWIDTH[ord('　')] = ' '
+
+CHARACTER_SETS = dict()
+def character_sets():
+  # MEMO: 最初に使う時に一度だけ作る (文字の table は字幕と共有している)
+  if not CHARACTER_SETS:
+    CHARACTER_SETS.update({
+      G_SET.KANJI: KANJI.shared(),
+      G_SET.ALNUM: ALNUM.shared(),
+      G_SET.HIRAGANA: HIRAGANA.shared(),
+      G_SET.KATAKANA: KATAKANA.shared(),
+      G_SET.MOSAIC_A: Dictionary(1, {}), # モザイクは文字にできない
+      G_SET.MOSAIC_B: Dictionary(1, {}),
+      G_SET.MOSAIC_C: Dictionary(1, {}),
+      G_SET.MOSAIC_D: Dictionary(1, {}),
+      G_SET.P_ALNUM: ALNUM.shared(), # プロポーショナルは文字としては同じ
+      G_SET.P_HIRAGANA: HIRAGANA.shared(),
+      G_SET.P_KATAKANA: KATAKANA.shared(),
+      G_SET.JIS_X0201_KATAKANA: JIS_X0201_KATAKANA.shared(),
+      G_SET.JIS_X0213_2004_KANJI_1: JIS_X0213_2004_KANJI_1.shared(),
+      G_SET.JIS_X0213_2004_KANJI_2: JIS_X0213_2004_KANJI_2.shared(),
+      G_SET.ADDITIONAL_SYMBOLS: ADDITIONAL_SYMBOLS.shared(),
+      DRCS | G_DRCS.MACRO: MACRO.shared(),
+    })
+    CHARACTER_SETS.update({ DRCS | code: Dictionary(2 if code == G_DRCS.DRCS_0 else 1, {}) for code in G_DRCS if code != G_DRCS.MACRO }) # 外字は図形なので文字にできない
+  return CHARACTER_SETS
+
+class IncrementalDecoder(codecs.IncrementalDecoder):
+  # MEMO: EPG (番組名, サービス名など) の初期状態 (字幕は G3 が MACRO になる)
+  DEFAULT = (G_SET.KANJI, G_SET.ALNUM, G_SET.HIRAGANA, G_SET.KATAKANA)
+  CONTROLS = frozenset(JIS8)
+  PARAMETERS = { JIS8.PAPF: 1, JIS8.APS: 2, JIS8.SZX: 1, JIS8.FLC: 1, JIS8.POL: 1, JIS8.WMM: 1, JIS8.HLC: 1 }
+
+  def __init__(self, errors = 'strict'):
+    super().__init__(errors)
+    self.sets = character_sets()
+    self.reset()
+
+  def reset(self):
+    self.pending = b''
+    self.G = list(self.DEFAULT)
+    self.GL, self.GR = 0, 2
+    self.middle = False
+    self.repeat = 1
+
+  def pack(self, G, GL, GR, middle, repeat):
+    state = GL | (GR << 2) | (middle << 4) | (repeat << 5)
+    for index, key in enumerate(G):
+      state |= key << (11 + 9 * index)
+    return state
+
+  def getstate(self):
+    # MEMO: 初期状態を 0 にするため DEFAULT との差分で持つ
+    return self.pending, self.pack(self.G, self.GL, self.GR, self.middle, self.repeat) ^ self.pack(self.DEFAULT, 0, 2, False, 1)
+
+  def setstate(self, state):
+    pending, flags = state
+    flags ^= self.pack(self.DEFAULT, 0, 2, False, 1)
+    self.pending = bytes(pending)
+    self.GL, self.GR = flags & 0x03, (flags >> 2) & 0x03
+    self.middle = bool((flags >> 4) & 0x01)
+    self.repeat = (flags >> 5) & 0x3F
+    self.G = [(flags >> (11 + 9 * index)) & 0x1FF for index in range(4)]
+
+  def decode(self, input, final = False):
+    data = self.pending + bytes(input)
+    output = []
+    begin, end = 0, len(data)
+    while begin < end:
+      next = self.step(data, begin, end, output)
+      if next is None: # 途中で切れているので続きを待つ
+        if not final: break
+        output.append(self.error(data, begin, end, 'truncated sequence'))
+        next = end
+      begin = next
+    self.pending = data[begin:]
+    return ''.join(output)
+
+  def error(self, data, begin, end, reason):
+    replacement, _ = codecs.lookup_error(self.errors)(UnicodeDecodeError(NAME, data, begin, end, reason))
+    return replacement
+
+  def step(self, data, begin, end, output):
+    # MEMO: 続きが足りない場合は何も変えずに None を返す
+    byte = data[begin]
+    if 0x20 < byte and byte < 0x7F:
+      return self.character(data, begin, end, self.G[self.GL], output, True)
+    elif 0xA0 < byte and byte < 0xFF:
+      return self.character(data, begin, end, self.G[self.GR], output, True)
+    elif byte == JIS8.SP:
+      output.append((' ' if self.middle else '　') * self.repeat)
+      self.repeat = 1
+      return begin + 1
+    elif byte == JIS8.APR:
+      output.append('\n')
+      return begin + 1
+    elif byte == JIS8.LS0 or byte == JIS8.LS1:
+      self.GL = 0 if byte == JIS8.LS0 else 1
+      return begin + 1
+    elif byte == JIS8.SS2 or byte == JIS8.SS3:
+      if begin + 1 >= end: return None
+      return self.character(data, begin + 1, end, self.G[2 if byte == JIS8.SS2 else 3], output, False)
+    elif byte == JIS8.ESC:
+      return self.escape(data, begin, end, output)
+    elif byte == JIS8.MSZ or byte == JIS8.NSZ or byte == JIS8.SSZ:
+      self.middle = byte == JIS8.MSZ
+      return begin + 1
+    elif byte in self.PARAMETERS:
+      return begin + 1 + self.PARAMETERS[byte] if begin + self.PARAMETERS[byte] < end else None
+    elif byte == JIS8.COL or byte == JIS8.CDC:
+      if begin + 1 >= end: return None
+      next = begin + (3 if data[begin + 1] == 0x20 else 2)
+      return next if next <= end else None
+    elif byte == JIS8.RPC:
+      if begin + 1 >= end: return None
+      self.repeat = (data[begin + 1] & 0x3F) or 1 # 0 は行末までの繰り返しなので 1 文字だけにする
+      return begin + 2
+    elif byte == JIS8.TIME:
+      if begin + 2 >= end: return None
+      if data[begin + 1] == 0x20 or data[begin + 1] == 0x28:
+        return begin + 3
+      return self.final(data, begin + 1, end)
+    elif byte == JIS8.CSI:
+      return self.final(data, begin + 1, end)
+    elif byte == JIS8.MACRO: # マクロ定義は MACRO 0x4F まで読み飛ばす
+      index = data.find(b'\x95\x4F', begin + 1, end)
+      return index + 2 if index >= 0 else None
+    elif byte in self.CONTROLS: # 色, 位置などの文字にならない制御符号
+      return begin + 1
+    else:
+      output.append(self.error(data, begin, begin + 1, 'undefined control code'))
+      return begin + 1
+
+  def final(self, data, begin, end):
+    # MEMO: CSI などのパラメータは終端文字 (0x40-0x7E) まで続く
+    for index in range(begin, end):
+      if 0x40 <= data[index] and data[index] <= 0x7E:
+        return index + 1
+    return None
+
+  def escape(self, data, begin, end, output):
+    if begin + 1 >= end: return None
+    F = data[begin + 1]
+    if F == ESC.LS2 or F == ESC.LS3:
+      self.GL = 2 if F == ESC.LS2 else 3
+      return begin + 2
+    elif F == ESC.LS1R or F == ESC.LS2R or F == ESC.LS3R:
+      self.GR = 1 if F == ESC.LS1R else 2 if F == ESC.LS2R else 3
+      return begin + 2
+
+    if 0x28 <= F and F <= 0x2B: # 1 byte G SET
+      index, begin_of_F = F - 0x28, begin + 2
+    elif F == 0x24: # 2 byte G SET
+      if begin + 2 >= end: return None
+      if 0x28 <= data[begin + 2] and data[begin + 2] <= 0x2B:
+        index, begin_of_F = data[begin + 2] - 0x28, begin + 3
+      else:
+        index, begin_of_F = 0, begin + 2
+    else:
+      output.append(self.error(data, begin, begin + 2, 'undefined escape sequence'))
+      return begin + 2
+
+    if begin_of_F >= end: return None
+    key = data[begin_of_F]
+    if key == 0x20: # DRCS
+      begin_of_F += 1
+      if begin_of_F >= end: return None
+      key = DRCS | data[begin_of_F]
+    if key in self.sets:
+      self.G[index] = key
+    else:
+      output.append(self.error(data, begin, begin_of_F + 1, 'undefined character set'))
+    return begin_of_F + 1
+
+  def character(self, data, begin, end, key, output, run):
+    dictionary = self.sets[key]
+    next = begin + dictionary.size
+    if next > end: return None
+
+    if run and self.repeat == 1 and isinstance(dictionary, CodeTable):
+      characters, next = dictionary.decode(data, begin, end)
+      if characters:
+        output.append(characters.translate(HALFWIDTH) if self.middle else characters)
+        return next
+      next = begin + dictionary.size
+
+    if any(not (0x21 <= (byte & 0x7F) and (byte & 0x7F) <= 0x7E) for byte in data[begin:next]): # 2 byte 目が文字でない
+      output.append(self.error(data, begin, begin + 1, 'incomplete multibyte sequence'))
+      return begin + 1
+
+    try:
+      character = dictionary.lookup(data, begin)
+    except KeyError:
+      character = None
+
+    if type(character) == str:
+      output.append((character.translate(HALFWIDTH) if self.middle else character) * self.repeat)
+    elif type(character) == tuple: # MACRO
+      self.G = [(DRCS | code) if isinstance(code, G_DRCS) else code for code in character]
+      self.GL, self.GR = 0, 2
+    else: # DRCS, モザイクなど文字にできないもの
+      output.append(self.error(data, begin, next, 'undefined character'))
+    self.repeat = 1
+    return next
+
+class IncrementalEncoder(codecs.IncrementalEncoder):
+
+  def encode(self, input, final = False):
+    return encode(input, self.errors)[0]
+
+def decode(input, errors = 'strict'):
+  return IncrementalDecoder(errors).decode(input, True), len(input)
+
+def encode(input, errors = 'strict'):
+  raise UnicodeEncodeError(NAME, input, 0, len(input), 'encoding is not supported')
+
+def search(name):
+  if name not in (NAME, NAME.replace('-', '_')): return None
+  return codecs.CodecInfo(name=NAME, encode=encode, decode=decode, incrementalencoder=IncrementalEncoder, incrementaldecoder=IncrementalDecoder)
+
+codecs.register(search)
@@ -0,0 +1,877 @@
+from enum import IntEnum
+from collections import OrderedDict
+
+from mpeg2ts.pes import PES
+from mpeg2ts.mjd import BCD
+
+from subtitle.JIS8 import JIS8, CSI, ESC, G_SET, G_DRCS
+from subtitle.color import pallets
+from subtitle.dictionary import Dictionary, DRCS, CodeTable, HIRAGANA, KATAKANA, ALNUM, KANJI, MACRO
+
+class NotImplementedYetError(Exception):
+  pass
+
+class Event(IntEnum):
+  TEXT = 0     # (TEXT, 文字列, 文字数, 位置)
+  STYLE = 1    # (STYLE, Style)
+  POSITION = 2 # (POSITION, 位置)
+  CLEAR = 3    # (CLEAR,)
+  TIME = 4     # (TIME, 秒)
+  DRCS = 5     # (DRCS, パターン, 幅, 高さ, 位置)
+  CONTROL = 6  # (CONTROL, 制御符号の byte 列)
+
+class Style:
+
+  def __init__(self, decoder):
+    self.fg, self.bg, self.orn = decoder.fg, decoder.bg, decoder.orn
+    self.swf, self.sdf, self.sdp = decoder.swf, decoder.sdf, decoder.sdp
+    self.ssm, self.shs, self.svs = decoder.ssm, decoder.shs, decoder.svs
+    self.text_size = decoder.text_size
+    self.stl = decoder.stl
+    self.hlc = decoder.hlc
+
+class Language:
+
+  def __init__(self, tag, DMF, DC, ISO_639_language_code, format, TCS, rollup_mode):
+    self.tag = tag
+    self.DMF = DMF
+    self.DC = DC
+    self.ISO_639_language_code = ISO_639_language_code
+    self.format = format
+    self.TCS = TCS
+    self.rollup_mode = rollup_mode
+
+class Management:
+  # MEMO: 字幕管理データ (data_group_id の下位 4bit が 0), 同じ組 (A/B) の同じ data_group_version の間は読み直さない
+  FORMATS = {
+    # MEMO: SWF の P1 と同じ番号 (5: 1920x1080 横書き, 6: 同縦書き, 7: 960x540 横書き, ...)
+    0b0101: (1920, 1080), 0b0110: (1920, 1080), # 横書き, 縦書き
+    0b0111: ( 960,  540), 0b1000: ( 960,  540),
+    0b1001: ( 720,  480), 0b1010: ( 720,  480),
+    0b1011: (1280,  720), 0b1100: (1280,  720),
+  }
+
+  def __init__(self, group, version, TMD, OTM, languages):
+    self.group = group # 0x00: A 組, 0x20: B 組
+    self.version = version
+    self.TMD = TMD
+    self.OTM = OTM
+    self.languages = languages
+
+class CaptionDecoder:
+  # MEMO: PES を一度だけ解釈して Event の列にする (VTT, TTML などはこの列を描画するだけ)
+  GEOMETRY = ((960, 540), (960, 540), (0, 0), (36, 36), 4, 24) # SWF, SDF, SDP, SSM, SHS, SVS の初期値
+
+  def __init__(self, pes, DRCS_limit = DRCS.LIMIT):
+    self.pes = pes
+    self.events = None
+    self.management = None
+    self.language = 1 # 第一言語
+
+    self.G_TEXT = {
+      G_SET.KANJI: KANJI.shared(),
+      G_SET.ALNUM: ALNUM.shared(),
+      G_SET.HIRAGANA: HIRAGANA.shared(),
+      G_SET.KATAKANA: KATAKANA.shared(),
+
+      #エラーがでたら対応する
+      G_SET.MOSAIC_A: None, # MOSAIC A
+      G_SET.MOSAIC_B: None, # MOSAIC B
+      G_SET.MOSAIC_C: None, # MOSAIC C
+      G_SET.MOSAIC_D: None, # MOSAIC D
+      # 実運用では出ないと規定されている
+      G_SET.P_ALNUM: None, # P ALNUM (TODO: TR で使われないと規定されてるのでページ数を書く)
+      G_SET.P_HIRAGANA: None, # P HIRAGANA (TODO: TR で使われないと規定されてるのでページ数を書く)
+      G_SET.P_KATAKANA: None, # P KATAKANA (TODO: TR で使われないと規定されてるのでページ数を書く)
+      # エラーが出たら対応する
+      G_SET.JIS_X0201_KATAKANA: None, # JIS X0201 KATAKANA
+      # ARIB TR-B14 第6.0版 第1分冊 p.89 で運用しないとされている
+      G_SET.JIS_X0213_2004_KANJI_1: None, # JIS 1 KANJI
+      G_SET.JIS_X0213_2004_KANJI_2: None, # JIS 2 KANJI
+      G_SET.ADDITIONAL_SYMBOLS: None, # ADDITIONAL SYMBOLS
+    }
+    self.G_OTHER = {
+      G_DRCS.DRCS_0: DRCS(2, DRCS_limit), # DRCS 2byte
+      G_DRCS.DRCS_1: DRCS(1, DRCS_limit), # DRCS 1byte
+      G_DRCS.DRCS_2: DRCS(1, DRCS_limit), # DRCS 1byte
+      G_DRCS.DRCS_3: DRCS(1, DRCS_limit), # DRCS 1byte
+      G_DRCS.DRCS_4: DRCS(1, DRCS_limit), # DRCS 1byte
+      G_DRCS.DRCS_5: DRCS(1, DRCS_limit), # DRCS 1byte
+      G_DRCS.DRCS_6: DRCS(1, DRCS_limit), # DRCS 1byte
+      G_DRCS.DRCS_7: DRCS(1, DRCS_limit), # DRCS 1byte
+      G_DRCS.DRCS_8: DRCS(1, DRCS_limit), # DRCS 1byte
+      G_DRCS.DRCS_9: DRCS(1, DRCS_limit), # DRCS 1byte
+      G_DRCS.DRCS_10: DRCS(1, DRCS_limit), # DRCS 1byte
+      G_DRCS.DRCS_11: DRCS(1, DRCS_limit), # DRCS 1byte
+      G_DRCS.DRCS_12: DRCS(1, DRCS_limit), # DRCS 1byte
+      G_DRCS.DRCS_13: DRCS(1, DRCS_limit), # DRCS 1byte
+      G_DRCS.DRCS_14: DRCS(1, DRCS_limit), # DRCS 1byte
+      G_DRCS.DRCS_15: DRCS(1, DRCS_limit), # DRCS 1byte
+      G_DRCS.MACRO: MACRO.shared()
+    }
+    # (WARN: 本来は SWF は字幕管理データから取得する)
+    self.geometry = CaptionDecoder.GEOMETRY
+    self.reset()
+    self.initialize()
+
+  def reset(self):
+    self.swf, self.sdf, self.sdp, self.ssm, self.shs, self.svs = self.geometry
+    self.text_size = (1, 1)
+    self.pos = None # MEMO: SDF, SDF, SDP が変化している事があるため
+    self.pallet = 0
+    self.fg = pallets[self.pallet][7]
+    self.bg = pallets[self.pallet][8]
+    self.orn = None
+    self.stl = False
+    self.hlc = 0
+    self.style_changed = True
+
+  def initialize(self):
+    self.G_BACK = [
+      self.G_TEXT[0x42],  # KANJI
+      self.G_TEXT[0x4A],  # ALNUM
+      self.G_TEXT[0x30],  # HIRAGANA
+      self.G_OTHER[0x70], # MACRO
+    ]
+    self.GL = 0
+    self.GR = 2
+
+  def PES_header_data_length(self):
+    return self.pes[PES.HEADER_SIZE + 2]
+
+  def PTS(self):
+    pts = 0
+    pts <<= 3; pts |= ((self.pes[PES.HEADER_SIZE + 3 + 0] & 0x0E) >> 1)
+    pts <<= 8; pts |= ((self.pes[PES.HEADER_SIZE + 3 + 1] & 0xFF) >> 0)
+    pts <<= 7; pts |= ((self.pes[PES.HEADER_SIZE + 3 + 2] & 0xFE) >> 1)
+    pts <<= 8; pts |= ((self.pes[PES.HEADER_SIZE + 3 + 3] & 0xFF) >> 0)
+    pts <<= 7; pts |= ((self.pes[PES.HEADER_SIZE + 3 + 4] & 0xFE) >> 1)
+    return pts
+
+  def decode(self):
+    if self.events is None:
+      self.events = []
+      self.generate()
+    return self.events
+
+  def data_group(self):
+    PES_data_packet_header_length = (self.pes[(PES.HEADER_SIZE + 3) + self.PES_header_data_length() + 2] & 0x0F)
+    return PES.HEADER_SIZE + (3 + self.PES_header_data_length()) + (3 + PES_data_packet_header_length)
+
+  def generate(self):
+    data_group = self.data_group()
+    data_group_id = (self.pes[data_group + 0] & 0xFC) >> 2
+    data_group_version = self.pes[data_group + 0] & 0x03
+    data_group_number = self.pes[data_group + 1]
+    last_data_group_number = self.pes[data_group + 2]
+    data_group_size = (self.pes[data_group + 3] << 8) + self.pes[data_group + 4]
+    CRC16 = (self.pes[data_group + (5 + data_group_size) + 0] << 8) | self.pes[data_group + (5 + data_group_size) + 1]
+
+    if (data_group_id & 0x0F) == 0: # 字幕管理データ
+      # MEMO: A 組と B 組 (data_group_id 0x00, 0x20) は別の字幕管理データなので、組が変われば version が同じでも読み直す
+      if self.management is None or (self.management.group, self.management.version) != (data_group_id & 0x20, data_group_version):
+        self.parse_management(data_group_id & 0x20, data_group_version, data_group + 5, data_group + (5 + data_group_size))
+      return
+    if (data_group_id & 0x0F) != self.language:
+      return
+
+    # MEMO: 字幕文の TMD が 01 (リアルタイム), 10 (オフセット時刻) なら STM (36bit + reserved 4bit) が続くので読み飛ばす
+    begin = data_group + 5
+    TMD = (self.pes[begin + 0] & 0xC0) >> 6
+    begin += 1
+    if TMD == 0b01 or TMD == 0b10:
+      begin += 5
+
+    data_unit_loop_length = (self.pes[begin + 0] << 16) | (self.pes[begin + 1] << 8) | self.pes[begin + 2]
+    self.parse_data_unit(begin + 3, min(data_group + (5 + data_group_size), begin + 3 + data_unit_loop_length))
+
+  def parse_management(self, group, version, begin, end):
+    TMD = (self.pes[begin + 0] & 0xC0) >> 6
+    begin += 1
+    OTM = None
+    if TMD == 0b10: # オフセット時刻
+      OTM = (BCD(self.pes[begin + 0]), BCD(self.pes[begin + 1]), BCD(self.pes[begin + 2]), BCD(self.pes[begin + 3]) * 10 + ((self.pes[begin + 4] & 0xF0) >> 4))
+      begin += 5
+
+    num_languages = self.pes[begin + 0]
+    begin += 1
+    languages = []
+    for _ in range(num_languages):
+      tag = (self.pes[begin + 0] & 0xE0) >> 5
+      DMF = self.pes[begin + 0] & 0x0F
+      begin += 1
+      DC = None
+      if DMF == 0b1100 or DMF == 0b1101 or DMF == 0b1110:
+        DC = self.pes[begin + 0]
+        begin += 1
+      ISO_639_language_code = bytes(self.pes[begin + 0:begin + 3]).decode('ascii', errors='replace')
+      format = (self.pes[begin + 3] & 0xF0) >> 4
+      TCS = (self.pes[begin + 3] & 0x0C) >> 2
+      rollup_mode = self.pes[begin + 3] & 0x03
+      languages.append(Language(tag, DMF, DC, ISO_639_language_code, format, TCS, rollup_mode))
+      begin += 4
+
+    self.management = Management(group, version, TMD, OTM, languages)
+
+    # MEMO: 表示書式から字幕文の SWF, SDF の初期値を決める (字幕文の中で SWF などが来ればそちらが優先)
+    if 1 <= self.language <= len(languages) and languages[self.language - 1].format in Management.FORMATS:
+      resolution = Management.FORMATS[languages[self.language - 1].format]
+      self.geometry = (resolution, resolution, (0, 0)) + self.geometry[3:]
+    else: # 解像度の決まらない表示書式なら前の字幕管理データの値を持ち越さずに初期値に戻す
+      self.geometry = CaptionDecoder.GEOMETRY
+
+    data_unit_loop_length = (self.pes[begin + 0] << 16) | (self.pes[begin + 1] << 8) | self.pes[begin + 2]
+    self.parse_data_unit(begin + 3, min(end, begin + 3 + data_unit_loop_length))
+
+  def parse_data_unit(self, begin, end):
+    data_unit = begin
+    while data_unit < end:
+      unit_separator = self.pes[data_unit + 0]
+      data_unit_parameter = self.pes[data_unit + 1]
+      data_unit_size = (self.pes[data_unit + 2] << 16) | (self.pes[data_unit + 3] << 8) | self.pes[data_unit + 4]
+
+      if data_unit_parameter == 0x20:
+        self.parse_text(data_unit + 5, data_unit + 5 + data_unit_size)
+      elif data_unit_parameter == 0x35:
+        raise NotImplementedYetError() # ビットマップデータ
+      elif data_unit_parameter == 0x30:
+        self.parse_DRCS(1, data_unit + 5, data_unit + 5 + data_unit_size)
+      elif data_unit_parameter == 0x31:
+        self.parse_DRCS(2, data_unit + 5, data_unit + 5 + data_unit_size)
+      else:
+        raise NotImplementedYetError() # 2バイトDRCS
+
+      data_unit += 5 + data_unit_size
+
+  def kukaku(self):
+    width = int((self.shs + self.ssm[0]) * self.text_size[0])
+    height = int((self.svs + self.ssm[1]) * self.text_size[1])
+    return (width, height)
+  def move_absolute_dot(self, x, y):
+    self.pos = (x, y)
+  def move_absolute_pos(self, x, y):
+    width, height = self.kukaku()
+    self.pos = (self.sdp[0] + x * width, self.sdp[1] + (y + 1) * height)
+  def move_relative_pos(self, x, y):
+    if not self.pos: self.move_absolute_pos(0, 0)
+    width, height = self.kukaku()
+    while x < 0:
+      x += 1
+      self.pos = (self.pos[0] - width, self.pos[1])
+      if self.pos[0] < self.sdp[0]:
+        self.pos = (self.sdp[0] + self.sdf[0] - width, self.pos[1])
+        y -= 1
+    if x > 0 and width > 0: # 1 文字ずつ進めずに、折り返しも含めて一度に進める
+      first = max(1, -(-(self.sdp[0] + self.sdf[0] - self.pos[0]) // width)) # 最初に折り返すまでの文字数
+      if x < first:
+        self.pos = (self.pos[0] + x * width, self.pos[1])
+      else:
+        x -= first
+        columns = max(1, -(-self.sdf[0] // width)) # 1 行の文字数
+        self.pos = (self.sdp[0] + (x % columns) * width, self.pos[1])
+        y += 1 + x // columns
+      x = 0
+    while x > 0:
+      x -= 1
+      self.pos = (self.pos[0] + width, self.pos[1])
+      if self.pos[0] >= self.sdp[0] + self.sdf[0]:
+        self.pos = (self.sdp[0], self.pos[1])
+        y += 1
+    self.pos = (self.pos[0], self.pos[1] + y * height)
+
+  def emit_position(self):
+    self.events.append((Event.POSITION, self.pos))
+
+  def emit_style(self):
+    if self.style_changed: # 変わった後に最初に描画する時にだけ出す
+      self.events.append((Event.STYLE, Style(self)))
+      self.style_changed = False
+
+  def move_newline(self):
+    if not self.pos: self.move_absolute_pos(0, 0)
+    width, height = self.kukaku()
+    self.pos = (self.sdp[0], self.pos[1] + height)
+
+  def define_DRCS(self, key, ch, pattern):
+    self.G_OTHER[key][ch] = pattern
+
+  def parse_DRCS(self, size, begin, end):
+    NumberOfCode = self.pes[begin + 0]
+    begin += 1
+    while begin < end:
+      CharacterCode = (self.pes[begin + 0] << 8) | self.pes[begin + 1]
+      NumberOfFont = self.pes[begin + 2]
+      if size == 1:
+        # 0x41 - 0x4F までが 1byte DRCS の対応なので、下の 4bit だけ取る
+        index, ch = (CharacterCode & 0x0F00) >> 8, ((CharacterCode & 0x00FF) >> 0) & 0x7F
+      elif size == 2:
+        ch = CharacterCode & 0x7F7F
+
+      begin += 3
+      for font in range(NumberOfFont):
+        fontId = (self.pes[begin + 0] & 0xF0) >> 4
+        mode = self.pes[begin + 0] & 0x0F
+        if mode == 0b0000 or mode == 0b0001 : #無圧縮の1bit(0000) or Nbit(0001) の DRCS
+          depth = self.pes[begin + 1]
+          width = self.pes[begin + 2]
+          height = self.pes[begin + 3]
+          depth_bits = len(bin(depth + 2)) - len(bin(depth + 2).rstrip('0'))
+          length = (width * height * depth_bits) // 8 # FIXME: depth = 階調数 - 2 なので対応する
+          if size == 1:
+            self.define_DRCS(0x40 + index, ch, self.pes[begin + 4: begin + 4 + length])
+            begin += 4 + length
+          elif size == 2:
+            self.define_DRCS(0x40, ch, self.pes[begin + 4: begin + 4 + length])
+            begin += 4 + length
+          else:
+            raise NotImplementedYetError()
+        else: # ジオメトリック図形は運用しない(TR-B14にて)
+          raise NotImplementedYetError()
+
+  def parse_text(self, begin, end):
+    while begin < end:
+      start = begin
+      byte = self.pes[begin]
+      if 0x20 < byte and byte < 0x7F:
+        begin = self.render_run(begin, end, self.G_BACK[self.GL])
+      elif 0xA0 < byte and byte < 0xFF:
+        begin = self.render_run(begin, end, self.G_BACK[self.GR])
+      else:
+        control = self.CONTROLS[byte]
+        if control is None:
+          raise NotImplementedYetError(hex(byte))
+        begin = control(self, begin)
+
+        self.events.append((Event.CONTROL, bytes(self.pes[start:begin])))
+
+  def control_NUL(self, begin):
+    return begin + 1 # (TODO: ignore したことをログに残す)
+
+  def control_BEL(self, begin):
+    return begin + 1 # (TODO: ignore したことをログに残す)
+
+  def control_APB(self, begin):
+    self.move_relative_pos(-1, 0)
+    self.emit_position()
+    return begin + 1
+
+  def control_APF(self, begin):
+    self.move_relative_pos(1, 0)
+    self.emit_position()
+    return begin + 1
+
+  def control_APD(self, begin):
+    self.move_relative_pos(0, 1)
+    self.emit_position()
+    return begin + 1
+
+  def control_APU(self, begin):
+    self.move_relative_pos(0, -1)
+    self.emit_position()
+    return begin + 1
+
+  def control_CS(self, begin):
+    self.events.append((Event.CLEAR,))
+    return begin + 1
+
+  def control_APR(self, begin):
+    self.move_newline()
+    self.emit_position()
+    return begin + 1
+
+  def control_LS1(self, begin):
+    self.GL = 1
+    return begin + 1
+
+  def control_LS0(self, begin):
+    self.GL = 0
+    return begin + 1
+
+  def control_PAPF(self, begin):
+    P1 = self.pes[begin + 1] & 0x3F # x
+    self.move_relative_pos(P1, 0)
+    self.emit_position()
+    return begin + 2
+
+  def control_CAN(self, begin):
+    return begin + 1 # (TODO: ignore したことをログに残す)
+
+  def control_SS2(self, begin):
+    size = self.G_BACK[2].size
+    self.render_character(self.pes, begin + 1, self.G_BACK[2])
+    return begin + 1 + size
+
+  def control_ESC(self, begin):
+    if self.pes[begin + 1] == ESC.LS2: ## LS2
+      self.GL = 2 #GL = G2
+      begin += 2
+    elif self.pes[begin + 1] == ESC.LS3: ## LS3
+      self.GL = 3 #GL = G3
+      begin += 2
+    elif self.pes[begin + 1] == ESC.LS1R: ## LS1R
+      self.GR = 1 #GR = G1
+      begin += 2
+    elif self.pes[begin + 1] == ESC.LS2R: ## LS2R
+      self.GR = 2 #GR = G2
+      begin += 2
+    elif self.pes[begin + 1] == ESC.LS3R: ## LS3R
+      self.GR = 3 #GR = G3
+      begin += 2
+    elif 0x28 <= self.pes[begin + 1] and self.pes[begin + 1] <= 0x2B: # 1 byte
+      GX = self.pes[begin + 1] - 0x28
+      if self.pes[begin + 2] == 0x20:
+        self.G_BACK[GX] = self.G_OTHER[self.pes[begin + 3]] # DRCS
+        begin += 4
+      else:
+        self.G_BACK[GX] = self.G_TEXT[self.pes[begin + 2]] # TEXT
+        begin += 3
+    elif self.pes[begin + 1] == 0x24: # 2 byte
+      if 0x28 <= self.pes[begin + 2] and self.pes[begin + 2] <= 0x2B: # 2 byte
+        GX = self.pes[begin + 2] - 0x28
+        if self.pes[begin + 3] == 0x20:
+          self.G_BACK[GX] = self.G_OTHER[self.pes[begin + 4]] # DRCS
+          begin += 5
+        else:
+          self.G_BACK[GX] = self.G_TEXT[self.pes[begin + 3]] # TEXT
+          begin += 4
+      else: # G0 (2byte G SET)
+        self.G_BACK[0] = self.G_TEXT[self.pes[begin + 2]]
+        begin += 3
+    else:
+      raise NotImplementedYetError(JIS8.ESC)
+    return begin
+
+  def control_APS(self, begin):
+    P1 = self.pes[begin + 1] & 0x3F # y
+    P2 = self.pes[begin + 2] & 0x3F # x
+    self.move_absolute_pos(P2, P1)
+    self.emit_position()
+    return begin + 3
+
+  def control_SS3(self, begin):
+    size = self.G_BACK[3].size
+    self.render_character(self.pes, begin + 1, self.G_BACK[3])
+    return begin + 1 + size
+
+  def control_RS(self, begin):
+    return begin + 1 # (TODO: ignore したことをログに残す)
+
+  def control_US(self, begin):
+    return begin + 1 # (TODO: ignore したことをログに残す)
+
+  def control_SP(self, begin):
+    self.render_character(b'\xa1\xa1', 0, self.G_TEXT[G_SET.KANJI]) # 全角スペース
+    return begin + 1
+
+  def control_DEL(self, begin):
+    return begin + 1 # (TODO: ignore したことをログに残す)
+
+  def control_BKF(self, begin):
+    self.fg = pallets[self.pallet][0]
+    self.style_changed = True
+    return begin + 1
+
+  def control_RDF(self, begin):
+    self.fg = pallets[self.pallet][1]
+    self.style_changed = True
+    return begin + 1
+
+  def control_GRF(self, begin):
+    self.fg = pallets[self.pallet][2]
+    self.style_changed = True
+    return begin + 1
+
+  def control_YLF(self, begin):
+    self.fg = pallets[self.pallet][3]
+    self.style_changed = True
+    return begin + 1
+
+  def control_BLF(self, begin):
+    self.fg = pallets[self.pallet][4]
+    self.style_changed = True
+    return begin + 1
+
+  def control_MGF(self, begin):
+    self.fg = pallets[self.pallet][5]
+    self.style_changed = True
+    return begin + 1
+
+  def control_CNF(self, begin):
+    self.fg = pallets[self.pallet][6]
+    self.style_changed = True
+    return begin + 1
+
+  def control_WHF(self, begin):
+    self.fg = pallets[self.pallet][7]
+    self.style_changed = True
+    return begin + 1
+
+  def control_SSZ(self, begin):
+    self.text_size = (0.5, 0.5)
+    self.style_changed = True
+    return begin + 1
+
+  def control_MSZ(self, begin):
+    self.text_size = (0.5, 1)
+    self.style_changed = True
+    return begin + 1
+
+  def control_NSZ(self, begin):
+    self.text_size = (1, 1)
+    self.style_changed = True
+    return begin + 1
+
+  def control_SZX(self, begin):
+    raise NotImplementedYetError(JIS8.SZX)
+
+  def control_COL(self, begin):
+    P1 = self.pes[begin + 1]
+    if P1 == 0x20:
+      P2 = self.pes[begin + 2] & 0x0F
+      self.pallet = P2
+      begin += 3
+    else:
+      color = P1 & 0x0F
+      if (P1 & 0x70) == 0x40:
+        self.fg = pallets[self.pallet][color]
+        self.style_changed = True
+      elif (P1 & 0x70) == 0x50:
+        self.bg = pallets[self.pallet][color]
+        self.style_changed = True
+      else:
+        # (TODO: ignore したことをログに残す)
+        pass
+      begin += 2
+    return begin
+
+  def control_FLC(self, begin): # 点滅(電話の着信を表す字幕で使われる)
+    return begin + 2 # (TODO: ignore したことをログに残す)
+
+  def control_CDC(self, begin):
+    raise NotImplementedYetError(JIS8.CDC)
+
+  def control_POL(self, begin):
+    raise NotImplementedYetError(JIS8.POL)
+
+  def control_WMM(self, begin):
+    raise NotImplementedYetError(JIS8.WMM)
+
+  def control_MACRO(self, begin):
+    raise NotImplementedYetError(JIS8.MACRO)
+
+  def control_HLC(self, begin):
+    self.prev_hlc = self.hlc
+    self.hlc = self.pes[begin + 1] & 0x0F
+    if self.prev_hlc == 0 and self.hlc != 0:
+      self.style_changed = True
+    elif self.prev_hlc != 0 and self.hlc == 0:
+      self.style_changed = True
+
+    return begin + 2
+
+  def control_RPC(self, begin):
+    raise NotImplementedYetError(JIS8.RPC)
+
+  def control_SPL(self, begin):
+    self.stl = False
+    self.style_changed = True
+    return begin + 1
+
+  def control_STL(self, begin):
+    self.stl = True
+    self.style_changed = True
+    return begin + 1
+
+  def control_CSI(self, begin):
+    last = begin + 1
+    while True:
+      if self.pes[last] == CSI.GSM:
+        raise NotImplementedYetError(CSI.GSM)
+      elif self.pes[last] == CSI.SWF:
+        index = begin + 1
+        P1 = 0
+        while self.pes[index] != 0x3B and self.pes[index] != 0x20:
+          P1 *= 10
+          P1 += self.pes[index] & 0x0F
+          index += 1
+        if self.pes[index] != 0x20:
+          raise NotImplementedYetError(CSI.SWF)
+        elif P1 == 5:
+          self.swf = (1920, 1080)
+          self.style_changed = True
+        elif P1 == 7:
+          self.swf = (960, 540)
+          self.style_changed = True
+        elif P1 == 9:
+          self.swf = (720, 480)
+          self.style_changed = True
+        else:
+          raise NotImplementedYetError(CSI.SWF)
+        break
+      elif self.pes[last] == CSI.CCC:
+        raise NotImplementedYetError(CSI.CCC)
+      elif self.pes[last] == CSI.SDF:
+        index = begin + 1
+        P1, P2 = 0, 0
+        while self.pes[index] != 0x3B:
+          P1 *= 10
+          P1 += self.pes[index] & 0x0F
+          index += 1
+        index += 1
+        while self.pes[index] != 0x20:
+          P2 *= 10
+          P2 += self.pes[index] & 0x0F
+          index += 1
+        self.sdf = (P1, P2)
+        self.style_changed = True
+        break
+      elif self.pes[last] == CSI.SSM:
+        index = begin + 1
+        P1, P2 = 0, 0
+        while self.pes[index] != 0x3B:
+          P1 *= 10
+          P1 += self.pes[index] & 0x0F
+          index += 1
+        index += 1
+        while self.pes[index] != 0x20:
+          P2 *= 10
+          P2 += self.pes[index] & 0x0F
+          index += 1
+        self.ssm = (P1, P2)
+        self.style_changed = True
+        break
+      elif self.pes[last] == CSI.SHS:
+        index = begin + 1
+        P1 = 0
+        while self.pes[index] != 0x20:
+          P1 *= 10
+          P1 += self.pes[index] & 0x0F
+          index += 1
+        self.shs = P1
+        self.style_changed = True
+        break
+      elif self.pes[last] == CSI.SVS:
+        index = begin + 1
+        P1 = 0
+        while self.pes[index] != 0x20:
+          P1 *= 10
+          P1 += self.pes[index] & 0x0F
+          index += 1
+        self.svs = P1
+        self.style_changed = True
+        break
+      elif self.pes[last] == CSI.PLD:
+        raise NotImplementedYetError(CSI.PLD)
+      elif self.pes[last] == CSI.PLU:
+        raise NotImplementedYetError(CSI.PLU)
+      elif self.pes[last] == CSI.GAA:
+        raise NotImplementedYetError(CSI.GAA)
+      elif self.pes[last] == CSI.SRC:
+        raise NotImplementedYetError(CSI.SRC)
+      elif self.pes[last] == CSI.SDP:
+        index = begin + 1
+        P1, P2 = 0, 0
+        while self.pes[index] != 0x3B:
+          P1 *= 10
+          P1 += self.pes[index] & 0x0F
+          index += 1
+        index += 1
+        while self.pes[index] != 0x20:
+          P2 *= 10
+          P2 += self.pes[index] & 0x0F
+          index += 1
+        self.sdp = (P1, P2)
+        self.style_changed = True
+        break
+      elif self.pes[last] == CSI.ACPS:
+        index = begin + 1
+        P1, P2 = 0, 0
+        while self.pes[index] != 0x3B:
+          P1 *= 10
+          P1 += self.pes[index] & 0x0F
+          index += 1
+        index += 1
+        while self.pes[index] != 0x20:
+          P2 *= 10
+          P2 += self.pes[index] & 0x0F
+          index += 1
+        self.move_absolute_dot(P1, P2)
+        self.emit_position()
+        break
+      elif self.pes[last] == CSI.TCC:
+        raise NotImplementedYetError(CSI.TCC)
+      elif self.pes[last] == CSI.ORN:
+        P1 = self.pes[begin + 1]
+        if P1 == 0x30:
+          self.orn = None
+        elif P1 == 0x31:
+          P2 = (self.pes[begin + 3] & 0x0F) * 10 + (self.pes[begin + 4] & 0x0F)
+          P3 = (self.pes[begin + 5] & 0x0F) * 10 + (self.pes[begin + 6] & 0x0F)
+          self.orn = pallets[P2][P3]
+          self.style_changed = True
+        else:
+          raise NotImplementedYetError(CSI.ORN)
+        break
+      elif self.pes[last] == CSI.MDF:
+        raise NotImplementedYetError(CSI.MDF)
+      elif self.pes[last] == CSI.CFS:
+        raise NotImplementedYetError(CSI.CFS)
+      elif self.pes[last] == CSI.XCS:
+        raise NotImplementedYetError(CSI.XCS)
+      elif self.pes[last] == CSI.SCR:
+        raise NotImplementedYetError(CSI.SCR)
+      elif self.pes[last] == CSI.PRA:
+        raise NotImplementedYetError(CSI.PRA)
+      elif self.pes[last] == CSI.ACS:
+        raise NotImplementedYetError(CSI.ACS)
+      elif self.pes[last] == CSI.UED:
+        raise NotImplementedYetError(CSI.UED)
+      elif self.pes[last] == CSI.RCS: # (CS の代わりに塗りつぶしで場合がある)
+        break #(TODO: 無視した事をログする)
+      elif self.pes[last] == CSI.SCS:
+        raise NotImplementedYetError(CSI.SCS)
+      else:
+        last += 1
+    return last + 1
+
+  def control_TIME(self, begin):
+    # (TODO: ignore したことをログに残す)
+    if self.pes[begin + 1] == 0x20:
+      self.events.append((Event.TIME, (self.pes[begin + 2] & 0x3F) / 10))
+      begin += 3
+    elif self.pes[begin + 1] == 0x28:
+      raise NotImplementedYetError(JIS8.TIME)
+    else:
+      raise NotImplementedYetError(JIS8.TIME)
+    return begin
+
+  def render_run(self, begin, end, dict):
+    characters, next = dict.decode(self.pes.payload, begin, end) if isinstance(dict, CodeTable) else ('', begin)
+    if not characters: # MACRO, DRCS と table で引けない文字は 1 文字ずつ
+      self.render_character(self.pes, begin, dict)
+      return begin + dict.size
+
+    count = (next - begin) // dict.size
+    if not self.pos: self.move_absolute_pos(0, 0)
+
+    self.emit_style()
+    self.events.append((Event.TEXT, characters, count, self.pos))
+
+    self.move_relative_pos(count, 0)
+    return next
+
+  def render_character(self, data, begin, dict):
+    if not self.pos: self.move_absolute_pos(0, 0)
+
+    character = dict.lookup(data, begin)
+
+    if type(character) == tuple: # MACRO
+      self.events.append((Event.CONTROL, bytes(data[begin:begin + dict.size])))
+      self.G_BACK = [(self.G_TEXT[dictionary] if dictionary in G_SET else self.G_OTHER[dictionary]) for dictionary in character]
+      self.GL = 0
+      self.GR = 2
+      return
+    elif type(character) == bytearray: # DRCS
+      self.emit_style()
+      self.events.append((Event.DRCS, character, int(self.ssm[0] * self.text_size[0]), int(self.ssm[1] * self.text_size[1]), self.pos))
+    else:
+      self.emit_style()
+      self.events.append((Event.TEXT, character, 1, self.pos))
+
+    self.move_relative_pos(1, 0)
+
+class Cue:
+  # MEMO: VTTGenerator, TTMLGenerator には CaptionDecoder の代わりに渡せる
+
+  def __init__(self, PTS, events, repeat = False):
+    self.pts = PTS
+    self.events = events
+    self.repeat = repeat # 直前の字幕文と同じ data group が再送された (表示は変わらないので書き出す側は読み飛ばす)
+
+  def PTS(self):
+    return self.pts
+
+  def decode(self):
+    return self.events
+
+class CaptionStreamDecoder(CaptionDecoder):
+  # MEMO: 字幕 PID 毎に一つ作って使い続ける (文字集合の table, 外字, 表示の初期値は PES をまたいで持ち越す)
+
+  CACHE_SIZE = 64
+
+  def __init__(self, DRCS_limit = DRCS.LIMIT, cache_size = CACHE_SIZE):
+    super().__init__(None, DRCS_limit)
+    # MEMO: 同じ data group は何度も再送されるので、解釈した結果を data group の中身で引けるようにしておく
+    self.cache = OrderedDict()
+    self.cache_size = cache_size
+    self.hits, self.misses = 0, 0
+    self.defined = None # cache に入れる data group の中で定義した外字
+    self.previous = None # 直前の字幕文の key
+
+  def define_DRCS(self, key, ch, pattern):
+    # MEMO: 外字の定義は後の PES からも参照されるので、cache から返す時にも同じ定義をやり直せるように残しておく
+    super().define_DRCS(key, ch, pattern)
+    if self.defined is not None: self.defined.append((key, ch, pattern))
+
+  def key(self):
+    data_group = self.data_group()
+    data_group_version = self.pes[data_group + 0] & 0x03
+    data_group_size = (self.pes[data_group + 3] << 8) + self.pes[data_group + 4]
+    return (data_group_version, self.geometry, bytes(self.pes[data_group:data_group + 5 + data_group_size]))
+
+  def is_management(self):
+    return (self.pes[self.data_group() + 0] & 0x3C) == 0
+
+  def feed(self, pes):
+    # MEMO: PES 毎に Cue を返す (字幕管理データなど字幕文が無い場合は events が空)
+    self.pes, self.events = pes, None
+    key = self.key() if self.cache_size > 0 and not self.is_management() else None # 字幕管理データは data_group_version で読み直しを決める
+    repeat = key is not None and key == self.previous
+    if key is not None: self.previous = key
+    if key in self.cache:
+      self.hits += 1
+      self.cache.move_to_end(key)
+      events, defined = self.cache[key]
+      for DRCS_key, ch, pattern in defined:
+        super().define_DRCS(DRCS_key, ch, pattern)
+      cue = Cue(self.PTS(), events, repeat)
+    else:
+      self.misses += 1
+      self.reset()
+      self.initialize() # 符号の指示は字幕文毎に初期化する (ARIB TR-B14)
+      self.defined = [] if key is not None else None
+      try:
+        cue = Cue(self.PTS(), self.decode())
+        if key is not None:
+          self.cache[key] = (cue.events, self.defined)
+          while len(self.cache) > self.cache_size:
+            self.cache.popitem(last = False)
+      finally:
+        self.defined = None
+    self.pes, self.events = None, None # PES は使い回されるので持たない
+    return [cue]
+
+class CaptionDecoders(dict):
+  # MEMO: 外字や表示の初期値を持ち越すので字幕 PID 毎に CaptionStreamDecoder を一つだけ作る (同じ PID を共有する番組でも一つ)
+
+  def __init__(self, DRCS_limit = DRCS.LIMIT, cache_size = CaptionStreamDecoder.CACHE_SIZE):
+    super().__init__()
+    self.DRCS_limit = DRCS_limit
+    self.cache_size = cache_size
+
+  def __missing__(self, PID):
+    decoder = self[PID] = CaptionStreamDecoder(self.DRCS_limit, self.cache_size)
+    return decoder
+
+  def feed(self, programs, pes):
+    # MEMO: ProgramDemuxer が yield した (programs, PES) をそのまま渡す
+    return self[programs[0].SUBTITLE_PID].feed(pes)
+
+# MEMO: 制御符号は byte 毎の分岐表で引く (クラス毎に一度だけ作る)
+def make_CONTROLS_table(decoder):
+  table = [None] * 0x100
+  for code in JIS8:
+    table[code] = getattr(decoder, f'control_{code.name}')
+  return table
+
+CaptionDecoder.CONTROLS = make_CONTROLS_table(CaptionDecoder)
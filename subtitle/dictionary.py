@@ -1,5 +1,38 @@
+import os
+import re
+import sys
+import marshal
+import tempfile
+from collections import OrderedDict
+
 from subtitle.JIS8 import G_SET, G_DRCS
 
+CACHE_VERSION = 1
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 'aribconv')
+
+def cached_table(name, size, generate):
+  # MEMO: codec から作る table は起動時間がかかるので、一度作ったものを marshal で保存して次回からは読むだけにする
+  key = (CACHE_VERSION, sys.version, os.stat(__file__).st_mtime_ns)
+  path = os.path.join(CACHE_DIR, f'{name}.marshal')
+  try:
+    with open(path, 'rb') as f:
+      cached_key, table = marshal.load(f)
+    if cached_key == key and len(table) == 94 ** size:
+      return list(table)
+  except (OSError, EOFError, ValueError, TypeError): # 無い、壊れている場合は作り直す
+    pass
+
+  table = CodeTable(size, generate()).table
+  try:
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with tempfile.NamedTemporaryFile('wb', dir=CACHE_DIR, delete=False) as f:
+      marshal.dump((key, tuple(table)), f)
+    os.chmod(f.name, 0o644)
+    os.replace(f.name, path)
+  except OSError: # 保存できなくても作った table はそのまま使える
+    pass
+  return table
+
 class Dictionary:
 
   def __init__(self, size, mapping):
@@ -15,7 +48,103 @@ class Dictionary:
   def __contains__(self, key):
     return key in self.mapping
 
-class HIRAGANA(Dictionary):
+  def lookup(self, data, begin):
+    if self.size == 1:
+      return self.mapping[data[begin] & 0x7F]
+    else:
+      return self.mapping[((data[begin] & 0x7F) << 8) | (data[begin + 1] & 0x7F)]
+
+  @classmethod
+  def shared(cls):
+    # MEMO: 文字集合の table は最初に使う時に一度だけ作って共有する (共有しているので書き換えないこと)
+    if 'instance' not in cls.__dict__:
+      cls.instance = cls()
+    return cls.instance
+
+class DRCS(Dictionary):
+  # MEMO: 外字は PES をまたいで参照されるので覚えておくが、増え続けないように使われていないものから捨てる
+  LIMIT = 256
+
+  def __init__(self, size, limit = LIMIT):
+    super().__init__(size, OrderedDict())
+    self.limit = limit
+
+  def __setitem__(self, key, value):
+    self.mapping[key] = value
+    self.mapping.move_to_end(key)
+    while len(self.mapping) > self.limit:
+      self.mapping.popitem(last = False)
+
+  def lookup(self, data, begin):
+    if self.size == 1:
+      key = data[begin] & 0x7F
+    else:
+      key = ((data[begin] & 0x7F) << 8) | (data[begin + 1] & 0x7F)
+    self.mapping.move_to_end(key)
+    return self.mapping[key]
+
+class CodeTable(Dictionary):
+  # MEMO: 94 文字 (1byte) / 94x94 文字 (2byte) の集合を row * 94 + cell で引ける平らな table で持つ
+  GL_RUN = re.compile(rb'[\x21-\x7E]+')
+  GR_RUN = re.compile(rb'[\xA1-\xFE]+')
+
+  def __init__(self, size, mapping = None, table = None):
+    self.size = size
+    self.table = table if table is not None else [None] * (94 ** size)
+    for key, value in (mapping or {}).items():
+      self[key] = value
+
+  @staticmethod
+  def graphic(byte):
+    # MEMO: 0x21-0x7E (GR は 0xA1-0xFE) だけが文字, 0x20 (SP) や 0x7F (DEL) を引くと隣の row の文字になってしまう
+    return 0x21 <= (byte & 0x7F) <= 0x7E
+
+  def index(self, key):
+    if self.size == 1:
+      if not (0 <= key <= 0xFF and self.graphic(key)): raise KeyError(key)
+      return (key & 0x7F) - 0x21
+    else:
+      if not (0 <= key <= 0xFFFF and self.graphic(key >> 8) and self.graphic(key)): raise KeyError(key)
+      return (((key >> 8) & 0x7F) - 0x21) * 94 + ((key & 0x7F) - 0x21)
+
+  def __getitem__(self, item):
+    character = self.table[self.index(item)]
+    if character is None: raise KeyError(item)
+    return character
+
+  def __setitem__(self, key, value):
+    self.table[self.index(key)] = value
+
+  def __contains__(self, key):
+    try:
+      return self.table[self.index(key)] is not None
+    except KeyError:
+      return False
+
+  def lookup(self, data, begin):
+    if self.size == 1:
+      if not self.graphic(data[begin]): raise KeyError(bytes(data[begin:begin + 1]))
+      character = self.table[(data[begin] & 0x7F) - 0x21]
+    else:
+      if not (self.graphic(data[begin]) and self.graphic(data[begin + 1])): raise KeyError(bytes(data[begin:begin + 2]))
+      character = self.table[((data[begin] & 0x7F) - 0x21) * 94 + ((data[begin + 1] & 0x7F) - 0x21)]
+    if character is None: raise KeyError(bytes(data[begin:begin + self.size]))
+    return character
+
+  def decode(self, data, begin, end):
+    # MEMO: begin から始まる GL (または GR) の連続した文字を一度に引く (返すのは文字列と次の位置)
+    run = (self.GR_RUN if data[begin] & 0x80 else self.GL_RUN).match(data, begin, end).end()
+    run -= (run - begin) % self.size
+    table = self.table
+    if self.size == 1:
+      characters = [table[(byte & 0x7F) - 0x21] for byte in data[begin:run]]
+    else:
+      characters = [table[((high & 0x7F) - 0x21) * 94 + ((low & 0x7F) - 0x21)] for high, low in zip(data[begin:run:2], data[begin + 1:run:2])]
+    if None in characters: # 引けない文字の手前までを返す
+      characters = characters[:characters.index(None)]
+    return ''.join(characters), begin + len(characters) * self.size
+
+class HIRAGANA(CodeTable):
 
   def __init__(self):
     super().__init__(1, {
@@ -27,7 +156,7 @@ class HIRAGANA(Dictionary):
       0x70 : 'ゐ', 0x71 : 'ゑ', 0x72 : 'を', 0x73 : 'ん', 0x77 : 'ゝ', 0x78 : 'ゞ', 0x79 : 'ー', 0x7A : '。', 0x7B : '「', 0x7C : '」', 0x7D : '、', 0x7E : '・',
     })
 
-class KATAKANA(Dictionary):
+class KATAKANA(CodeTable):
 
   def __init__(self):
     super().__init__(1, {
@@ -39,7 +168,7 @@ class KATAKANA(Dictionary):
       0x70 : 'ヰ', 0x71 : 'ヱ', 0x72 : 'ヲ', 0x73 : 'ン', 0x74 : 'ヴ', 0x75 : 'ヵ', 0x76 : 'ヶ', 0x77 : 'ヽ', 0x78 : 'ヾ', 0x79 : 'ー', 0x7A : '。', 0x7B : '「', 0x7C : '」', 0x7D : '、', 0x7E : '・',
     })
 
-class ALNUM(Dictionary):
+class ALNUM(CodeTable):
 
   def __init__(self):
     super().__init__(1, {
@@ -51,11 +180,19 @@ class ALNUM(Dictionary):
       0x70 : 'ｐ', 0x71 : 'ｑ', 0x72 : 'ｒ', 0x73 : 'ｓ', 0x74 : 'ｔ', 0x75 : 'ｕ', 0x76 : 'ｖ', 0x77 : 'ｗ', 0x78 : 'ｘ', 0x79 : 'ｙ', 0x7A : 'ｚ', 0x7B : '｛', 0x7C : '｜', 0x7D : '｝', 0x7E : '～',
     })
 
-class KANJI(Dictionary):
+class JIS_X0201_KATAKANA(CodeTable):
+
+  def __init__(self):
+    super().__init__(1, { ch : chr(0xFF61 + ch - 0x21) for ch in range(0x21, 0x60) }) # 半角カタカナ
+
+class KANJI(CodeTable):
 
   def __init__(self):
+    super().__init__(2, table = cached_table('KANJI', 2, self.generate))
+
+  def generate(self):
     mapping = {}
-    symbols = ADDITIONAL_SYMBOLS()
+    symbols = ADDITIONAL_SYMBOLS.shared()
     for ch1 in range(0x21, 0x75):
       for ch2 in range(0x21, 0x7F):
         key = (ch1 << 8) | ch2
@@ -69,12 +206,14 @@ class KANJI(Dictionary):
       for ch2 in range(0x21, 0x7F):
         key = (ch1 << 8) | ch2
         mapping[key] = symbols[key] if (key in symbols) else ''
+    return mapping
 
-    super().__init__(2, mapping)
-
-class JIS_X0213_2004_KANJI_1(Dictionary):
+class JIS_X0213_2004_KANJI_1(CodeTable):
 
   def __init__(self):
+    super().__init__(2, table = cached_table('JIS_X0213_2004_KANJI_1', 2, self.generate))
+
+  def generate(self):
     mapping = dict()
     for ch1 in range(0x21, 0x7F):
       for ch2 in range(0x21, 0x7F):
@@ -84,11 +223,14 @@ class JIS_X0213_2004_KANJI_1(Dictionary):
           mapping[(ch1 << 8) | ch2] = (GR1 + GR2).decode('euc_jis_2004')
         except:
           mapping[(ch1 << 8) | ch2] = ''
-    super().__init__(2, mapping)
+    return mapping
 
-class JIS_X0213_2004_KANJI_2(Dictionary):
+class JIS_X0213_2004_KANJI_2(CodeTable):
 
   def __init__(self):
+    super().__init__(2, table = cached_table('JIS_X0213_2004_KANJI_2', 2, self.generate))
+
+  def generate(self):
     mapping = dict()
     for ch1 in range(0x21, 0x7F):
       for ch2 in range(0x21, 0x7F):
@@ -98,7 +240,7 @@ class JIS_X0213_2004_KANJI_2(Dictionary):
           mapping[(ch1 << 8) | ch2] = (b'\x8F' + GR1 + GR2).decode('euc_jis_2004')
         except:
           mapping[(ch1 << 8) | ch2] = ''
-    super().__init__(2, mapping)
+    return mapping
 
 class MACRO(Dictionary):
 
@@ -122,7 +264,7 @@ class MACRO(Dictionary):
       0x6F: (   G_SET.ALNUM, G_SET.MOSAIC_A, G_DRCS.DRCS_1,  G_DRCS.MACRO),
     })
 
-class ADDITIONAL_SYMBOLS(Dictionary):
+class ADDITIONAL_SYMBOLS(CodeTable):
 
   def __init__(self):
     super().__init__(2, {
@@ -1153,3 +1295,8 @@ class ADDITIONAL_SYMBOLS(Dictionary):
       0x7E59: "\U0001F128", # 94-57: PARENTHESIZED LATIN CAPITAL LETTER Y
       0x7E5A: "\U0001F129", # 94-58: PARENTHESIZED LATIN CAPITAL LETTER Z
     })
+
+if __name__ == '__main__': # python3 -m subtitle.dictionary で cache を先に作っておける
+  KANJI()
+  JIS_X0213_2004_KANJI_1()
+  JIS_X0213_2004_KANJI_2()
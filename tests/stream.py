@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+# MEMO: test 用に TS を組み立てる (PAT, PMT, PCR, 字幕 PES だけの最小限のもの)
+
+import struct
+
+from mpeg2ts.crc import CRC32
+from mpeg2ts.packet import Packet
+
+class Stream:
+
+  def __init__(self):
+    self.counters = dict()
+    self.packets = []
+
+  def bytes(self):
+    return b''.join(self.packets)
+
+  def counter(self, pid):
+    counter = self.counters.get(pid, 0)
+    self.counters[pid] = (counter + 1) & 0x0F
+    return counter
+
+  def payload(self, pid, payload, PUSI = True):
+    payload = bytes(payload)
+    while True:
+      chunk, payload = payload[:Packet.PACKET_SIZE - Packet.HEADER_SIZE], payload[Packet.PACKET_SIZE - Packet.HEADER_SIZE:]
+      header = bytes([0x47, (0x40 if PUSI else 0x00) | (pid >> 8), pid & 0xFF])
+      stuffing = Packet.PACKET_SIZE - Packet.HEADER_SIZE - len(chunk)
+      if stuffing == 0:
+        self.packets.append(header + bytes([0x10 | self.counter(pid)]) + chunk)
+      else: # adaptation field で詰める (PES の後ろに 0xFF を置くと中身と区別できない)
+        adaptation = bytes([stuffing - 1]) + (bytes([0x00]) + b'\xff' * (stuffing - 2) if stuffing > 1 else b'')
+        self.packets.append(header + bytes([0x30 | self.counter(pid)]) + adaptation + chunk)
+      PUSI = False
+      if not payload: return
+
+  def section(self, pid, table_id, table_id_extension, body, version = 0):
+    length = 5 + len(body) + 4
+    section = bytes([table_id, 0xB0 | (length >> 8), length & 0xFF, table_id_extension >> 8, table_id_extension & 0xFF, 0xC1 | (version << 1), 0x00, 0x00]) + body
+    self.payload(pid, b'\x00' + section + struct.pack('>I', CRC32(section)))
+
+  def PAT(self, programs, version = 0):
+    self.section(0x00, 0x00, 0x0001, b''.join(struct.pack('>HH', program_number, 0xE000 | PMT_PID) for program_number, PMT_PID in programs), version)
+
+  def PMT(self, PMT_PID, program_number, PCR_PID, SUBTITLE_PID, version = 0):
+    body = bytes([0xE0 | (PCR_PID >> 8), PCR_PID & 0xFF, 0xF0, 0x00])
+    body += bytes([0x06, 0xE0 | (SUBTITLE_PID >> 8), SUBTITLE_PID & 0xFF, 0xF0, 0x03, 0x52, 0x01, 0x30]) # stream_identifier_descriptor (component_tag 0x30)
+    self.section(PMT_PID, 0x02, program_number, body, version)
+
+  def PCR(self, pid, PCR):
+    PCR = bytes([(PCR >> 25) & 0xFF, (PCR >> 17) & 0xFF, (PCR >> 9) & 0xFF, (PCR >> 1) & 0xFF, ((PCR & 1) << 7) | 0x7E, 0x00])
+    adaptation = bytes([0x10]) + PCR + b'\xff' * (Packet.PACKET_SIZE - Packet.HEADER_SIZE - 1 - 1 - len(PCR))
+    self.packets.append(bytes([0x47, pid >> 8, pid & 0xFF, 0x20 | self.counter(pid), len(adaptation)]) + adaptation)
+
+  def caption(self, pid, PTS, data_group):
+    self.payload(pid, caption_PES(PTS, data_group))
+
+def PES_packet(PTS, data):
+  PTS = bytes([0x21 | ((PTS >> 29) & 0x0E), (PTS >> 22) & 0xFF, 0x01 | ((PTS >> 14) & 0xFE), (PTS >> 7) & 0xFF, 0x01 | ((PTS << 1) & 0xFE)])
+  payload = bytes([0x80, 0x80, len(PTS)]) + PTS + data
+  return b'\x00\x00\x01\xBD' + struct.pack('>H', len(payload)) + payload
+
+def caption_PES(PTS, data_group):
+  return PES_packet(PTS, bytes([0x80, 0xFF, 0xF0]) + data_group)
+
+def CRC16(data):
+  crc = 0
+  for byte in data:
+    crc ^= byte << 8
+    for _ in range(8):
+      crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+      crc &= 0xFFFF
+  return crc
+
+def data_unit(parameter, data):
+  return bytes([0x1F, parameter]) + struct.pack('>I', len(data))[1:] + data
+
+def data_group(data_group_id, version, body):
+  group = bytes([(data_group_id << 2) | version, 0x00, 0x00]) + struct.pack('>H', len(body)) + body
+  return group + struct.pack('>H', CRC16(group))
+
+def management(data_group_id = 0x00, version = 0, format = 0b1000, TMD = 0b00):
+  # MEMO: 第一言語 (jpn) だけの字幕管理データ
+  units = b''
+  body = bytes([TMD << 6]) + (b'\x00\x00\x00\x00\x00' if TMD == 0b10 else b'') + bytes([1, 0x0F]) + b'jpn' + bytes([format << 4]) + struct.pack('>I', len(units))[1:] + units
+  return data_group(data_group_id, version, body)
+
+def statement(text, data_group_id = 0x01, version = 0, TMD = 0b00, STM = b''):
+  units = data_unit(0x20, text)
+  body = bytes([TMD << 6]) + STM + struct.pack('>I', len(units))[1:] + units
+  return data_group(data_group_id, version, body)
+
+def kanji(text):
+  # MEMO: 初期状態の G0 は漢字系集合なので、2byte の JIS を GL で置く (英数字は全角にする)
+  text = text.translate({code: code + 0xFEE0 for code in range(0x21, 0x7F)})
+  return bytes(byte & 0x7F for byte in text.encode('euc_jp'))
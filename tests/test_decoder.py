@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+
+import unittest
+
+from mpeg2ts.pes import PES
+from subtitle.decoder import CaptionDecoder, CaptionStreamDecoder
+from subtitle.vtt import VTTGenerator
+
+from stream import caption_PES, management, statement, kanji
+
+class CaptionStreamDecoderTest(unittest.TestCase):
+
+  def test_management_group(self):
+    decoder = CaptionStreamDecoder()
+    decoder.feed(PES(caption_PES(0, management(0x00, 0, 0b0111))))
+    self.assertEqual(decoder.geometry[0], (960, 540))
+    # MEMO: 組が変われば data_group_version が同じでも別の字幕管理データ
+    decoder.feed(PES(caption_PES(0, management(0x20, 0, 0b0101))))
+    self.assertEqual(decoder.geometry[0], (1920, 1080))
+    decoder.feed(PES(caption_PES(0, management(0x20, 0, 0b0111))))
+    self.assertEqual(decoder.geometry[0], (1920, 1080))
+    decoder.feed(PES(caption_PES(0, management(0x00, 0, 0b1011))))
+    self.assertEqual(decoder.geometry[0], (1280, 720))
+    # MEMO: 解像度の無い表示書式なら初期値に戻す
+    decoder.feed(PES(caption_PES(0, management(0x00, 1, 0b1111))))
+    self.assertEqual(decoder.geometry, CaptionDecoder.GEOMETRY)
+
+  def test_statement_TMD(self):
+    for TMD, STM in ((0b00, b''), (0b01, b'\x12\x34\x56\x78\x90'), (0b10, b'\x00\x00\x01\x50\x00')):
+      decoder = CaptionStreamDecoder()
+      cue, = decoder.feed(PES(caption_PES(0, statement(b'\x0c' + kanji('字幕'), TMD = TMD, STM = STM))))
+      VTT = VTTGenerator(None, cue)
+      VTT.generate()
+      self.assertEqual(VTT.text, '字幕')
+
+  def test_repeat(self):
+    decoder = CaptionStreamDecoder()
+    A, B = statement(b'\x0c' + kanji('前'), version = 0), statement(b'\x0c' + kanji('次'), version = 1)
+    repeats = []
+    for PTS, group in enumerate((A, A, management(), A, B, A)):
+      cue, = decoder.feed(PES(caption_PES(PTS, group)))
+      repeats.append(cue.repeat)
+    # MEMO: 直前の字幕文と同じものだけが再送 (字幕管理データは挟まっても良い, B の後の A は表示が変わる)
+    self.assertEqual(repeats, [False, True, False, True, False, False])
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+
+import unittest
+
+from subtitle.dictionary import HIRAGANA, KANJI
+
+class CodeTableTest(unittest.TestCase):
+
+  def test_lookup_boundary(self):
+    hiragana, kanji = HIRAGANA.shared(), KANJI.shared()
+    self.assertEqual(hiragana.lookup(b'\x21', 0), 'ぁ')
+    self.assertEqual(hiragana.lookup(b'\x7e', 0), '・')
+    self.assertEqual(hiragana.lookup(b'\xa1', 0), 'ぁ') # GR
+    self.assertEqual(kanji.lookup(b'\x21\x21', 0), '　')
+    self.assertEqual(kanji.lookup(b'\x30\x21', 0), '亜')
+    self.assertEqual(kanji.lookup(b'\x30\x7e', 0), '蔭')
+    self.assertEqual(kanji.lookup(b'\x31\x21', 0), '院')
+    for data in (b'\x20', b'\x7f', b'\xa0', b'\xff'):
+      with self.assertRaises(KeyError): hiragana.lookup(data, 0)
+    for data in (b'\x30\x20', b'\x30\x7f', b'\x20\x21', b'\x7f\x21', b'\xb0\xff'):
+      with self.assertRaises(KeyError): kanji.lookup(data, 0)
+
+  def test_index_boundary(self):
+    hiragana, kanji = HIRAGANA.shared(), KANJI.shared()
+    self.assertIn(0x21, hiragana)
+    self.assertIn(0x7E, hiragana)
+    self.assertEqual(hiragana[0x7E], '・')
+    self.assertEqual(kanji[0x307E], '蔭')
+    for key in (0x20, 0x7F, 0x120):
+      self.assertNotIn(key, hiragana)
+      with self.assertRaises(KeyError): hiragana[key]
+    for key in (0x3020, 0x307F, 0x2021, 0x7F21):
+      self.assertNotIn(key, kanji)
+      with self.assertRaises(KeyError): kanji[key]
+
+if __name__ == '__main__':
+  unittest.main()
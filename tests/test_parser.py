@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+
+import unittest
+
+from mpeg2ts.packet import Packet
+from mpeg2ts.parser import PESParser
+
+from stream import Stream, PES_packet
+
+def parse(stream):
+  parser, result = PESParser(), []
+  for packet in stream.packets:
+    parser.push(Packet(packet))
+    while not parser.empty():
+      pes = parser.pop()
+      result.append(bytes(pes[0:len(pes)]))
+      parser.release(pes)
+  return result
+
+class PESParserTest(unittest.TestCase):
+
+  def test_truncated_header(self):
+    # MEMO: header (6byte) の途中で次の PES が始まる
+    stream = Stream()
+    stream.payload(0x130, b'\x00\x00\x01')
+    stream.payload(0x130, PES_packet(0, b'\x01' * 10))
+    self.assertEqual(parse(stream), [PES_packet(0, b'\x01' * 10)])
+
+  def test_truncated_header_reused_buffer(self):
+    # MEMO: 使い回しの buffer に残っている前の PES の PES_packet_length (0) を読まない
+    unbounded = b'\x00\x00\x01\xBD\x00\x00\x80\x00\x00'
+    stream = Stream()
+    stream.payload(0x130, unbounded + b'\x01' * 10)
+    stream.payload(0x130, b'\x00\x00\x01')
+    stream.payload(0x130, unbounded + b'\x02' * 10)
+    stream.payload(0x130, PES_packet(0, b'\x03' * 10))
+    self.assertEqual(parse(stream), [unbounded + b'\x01' * 10, unbounded + b'\x02' * 10, PES_packet(0, b'\x03' * 10)])
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+
+import io
+import unittest
+
+from mpeg2ts.reader import PacketReader
+from mpeg2ts.program import ProgramDemuxer
+from subtitle.decoder import CaptionStreamDecoder
+from subtitle.vtt import VTTGenerator
+
+from stream import Stream, management, statement, kanji
+
+HZ = 90000
+BASE = 1000000
+
+def captions(data):
+  # MEMO: to-text-vtt.py と同じように字幕の PTS を番組の media time (秒) にする
+  demuxer, decoder = ProgramDemuxer(PacketReader(io.BytesIO(data))), CaptionStreamDecoder()
+  result = []
+  for programs, SUBTITLE in demuxer:
+    if not programs: continue
+    for cue in decoder.feed(SUBTITLE):
+      VTT = VTTGenerator(None, cue)
+      VTT.generate()
+      if not VTT.text: continue
+      result.extend((program.timeline.seconds(VTT.PTS()), VTT.text) for program in programs if not program.timeline.empty())
+  return result
+
+class ProgramDemuxerTest(unittest.TestCase):
+
+  def test_PMT_PID_change_keeps_media_time(self):
+    stream = Stream()
+    PMT_PID = 0x1F0
+    for second in range(120):
+      if second == 60: PMT_PID = 0x1E0 # 番組はそのままで PMT の PID だけ変わる
+      stream.PAT([(1, PMT_PID)], 0 if PMT_PID == 0x1F0 else 1)
+      stream.PMT(PMT_PID, 1, 0x1FF, 0x130)
+      stream.PCR(0x1FF, BASE + second * HZ)
+      if second % 10 == 0:
+        stream.caption(0x130, BASE + second * HZ, management())
+      if second % 30 == 1:
+        stream.caption(0x130, BASE + second * HZ + HZ // 2, statement(b'\x0c' + kanji(f'字幕{second}')))
+
+    cues = captions(stream.bytes())
+    self.assertEqual([text for _, text in cues], ['字幕１', '字幕３１', '字幕６１', '字幕９１'])
+    times = [time for time, _ in cues]
+    self.assertEqual(times, sorted(times))
+    self.assertAlmostEqual(times[2], 61.5)
+
+if __name__ == '__main__':
+  unittest.main()
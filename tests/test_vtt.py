@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+
+import io
+import unittest
+from datetime import timedelta
+
+from subtitle.vtt import VTTWriter
+
+class VTTWriterTest(unittest.TestCase):
+
+  def test_repeat(self):
+    output = io.StringIO()
+    writer = VTTWriter(output, header = None)
+    writer.push(timedelta(seconds=1), None, '前')
+    writer.push(timedelta(seconds=2), None, '前', repeat = True) # 再送は前の cue の続き
+    writer.push(timedelta(seconds=3), None, '次')
+    writer.close(timedelta(seconds=4))
+    self.assertEqual(output.getvalue(), "WEBVTT\n\n00:00:01.000 --> 00:00:03.000\n前\n\n00:00:03.000 --> 00:00:04.000\n次\n")
+
+  def test_flush_interval(self):
+    class Output(io.StringIO):
+      def flush(self):
+        self.flushed = self.getvalue()
+    output = Output()
+    writer = VTTWriter(output, 2, header = None)
+    writer.push(timedelta(seconds=10), timedelta(seconds=11), '前')
+    self.assertEqual(output.flushed, output.getvalue()) # 最初は直ぐに出す
+    writer.push(timedelta(seconds=11), timedelta(seconds=12), '次')
+    writer.advance(timedelta(seconds=11.5))
+    self.assertNotEqual(output.flushed, output.getvalue())
+    writer.advance(timedelta(seconds=12)) # media time で flush_interval 経った
+    self.assertEqual(output.flushed, output.getvalue())
+
+if __name__ == '__main__':
+  unittest.main()
@@ -8,10 +8,9 @@ import tempfile
 from pathlib import Path
 from datetime import datetime, timedelta
 
-from mpeg2ts.packet import Packet
-from mpeg2ts.section import Section
-from mpeg2ts.parser import SectionParser, PESParser
-from mpeg2ts.mjd import BCD, MJD_to_YMD
+from mpeg2ts.reader import open_reader
+from mpeg2ts.program import ProgramDemuxer
+from subtitle.decoder import CaptionDecoders
 from subtitle.generator import TTMLGenerator
 
 if __name__ == "__main__":
@@ -19,93 +18,32 @@ if __name__ == "__main__":
 
   parser.add_argument('-i', '--input', type=argparse.FileType('rb'), nargs='?', default=sys.stdin.buffer)
   parser.add_argument('-o', '--output', type=Path, nargs='?', default=Path(os.getcwd()))
-  parser.add_argument('-s', '--SID', type=int, nargs='?')
+  parser.add_argument('-s', '--SID', type=int, action='append')
+  parser.add_argument('-a', '--all', action='store_true')
 
   args = parser.parse_args()
 
-  PAT_Parser = SectionParser()
-  PMT_Parser = SectionParser()
-  TOT_Parser = SectionParser()
-  SUBTITLE_Parser = PESParser()
+  multiple = args.all or (args.SID is not None and len(args.SID) > 1)
+  SUBTITLES = dict()
+  DECODERS = CaptionDecoders()
 
-  PMT_PID = -1
-  PCR_PID = -1
-  SUBTITLE_PID = -1
+  for programs, SUBTITLE in ProgramDemuxer(open_reader(args.input), args.SID, args.all):
+    if not programs: continue
+    for cue in DECODERS.feed(programs, SUBTITLE):
+      ttml = TTMLGenerator(None, cue)
+      PTS = ttml.PTS()
 
-  FIRST_PCR = None
+      ttml.generate()
+      print([ (tt.region(), tt.body() ) for tt in ttml.regions])
 
-  SUBTITLES = []
+      for program in programs:
+        CUES = SUBTITLES.setdefault(program.program_number, [])
 
-  while args.input:
-    while True:
-      sync_byte = args.input.read(1)
-      if not sync_byte: sys.exit()
-      if sync_byte == Packet.SYNC_BYTE: break
+        if program.timeline.empty(): continue
+        elapsed_seconds = timedelta(seconds = program.timeline.seconds(PTS))
+        if len(CUES) > 0:
+          CUES[-1] = (CUES[-1][0], elapsed_seconds, CUES[-1][2])
 
-    packet = Packet.SYNC_BYTE + args.input.read(Packet.PACKET_SIZE - 1)
-    ts = Packet(packet)
+        CUES.append((elapsed_seconds, None, ttml.regions))
 
-    if ts.pid() == 0x00:
-      PAT_Parser.push(ts)
-      while not PAT_Parser.empty():
-        PAT = PAT_Parser.pop()
-        if PAT.CRC32() != 0: continue
-
-        begin = Section.HEADER_SIZE
-        while begin < 3 + PAT.section_length() - Section.CRC_SIZE:
-          program_number = (PAT[begin + 0] << 8) | PAT[begin + 1]
-          program_map_PID = ((PAT[begin + 2] & 0x1F) << 8) | PAT[begin + 3]
-
-          if program_number == args.SID:
-            PMT_PID = program_map_PID
-          elif PMT_PID == -1 and args.SID is None:
-            PMT_PID = program_map_PID
-
-          begin += 4
-    elif ts.pid() == PMT_PID:
-      PMT_Parser.push(ts)
-      while not PMT_Parser.empty():
-        PMT = PMT_Parser.pop()
-        if PMT.CRC32() != 0: continue
-
-        PCR_PID = ((PMT[Section.HEADER_SIZE + 0] & 0x1F) << 8) | PMT[Section.HEADER_SIZE + 1]
-        program_info_length = ((PMT[Section.HEADER_SIZE + 2] & 0x0F) << 8) | PMT[Section.HEADER_SIZE + 3]
-
-        begin = Section.HEADER_SIZE + 4 + program_info_length
-        while begin < 3 + PMT.section_length() - Section.CRC_SIZE:
-          stream_type = PMT[begin + 0]
-          elementary_PID = ((PMT[begin + 1] & 0x1F) << 8) | PMT[begin + 2]
-          ES_info_length = ((PMT[begin + 3] & 0x0F) << 8) | PMT[begin + 4]
-
-          descriptor = begin + 5
-          while descriptor < (begin + 5 + ES_info_length):
-            descriptor_tag = PMT[descriptor + 0]
-            descriptor_length = PMT[descriptor + 1]
-            if descriptor_tag == 0x52:
-              component_tag = PMT[descriptor + 2]
-              if stream_type == 0x06:
-                SUBTITLE_PID = elementary_PID
-            descriptor += 2 + descriptor_length
-
-          begin += 5 + ES_info_length
-    elif ts.pid() == PCR_PID:
-      if not FIRST_PCR:
-        FIRST_PCR = ts.pcr()
-    elif ts.pid() == SUBTITLE_PID:
-      SUBTITLE_Parser.push(ts)
-      while not SUBTITLE_Parser.empty():
-        SUBTITLE = SUBTITLE_Parser.pop()
-
-        ttml = TTMLGenerator(SUBTITLE)
-        elapsed_seconds = timedelta(seconds = (((1 << 33) + (ttml.PTS() - FIRST_PCR)) % (1 << 33)) / 90000)
-
-        if len(SUBTITLES) > 0:
-          SUBTITLES[-1] = (SUBTITLES[-1][0], elapsed_seconds, SUBTITLES[-1][2])
-
-        ttml.generate()
-        print([ (tt.region(), tt.body() ) for tt in ttml.regions])
-
-        SUBTITLES.append((elapsed_seconds, None, ttml.regions))
-
-  print(SUBTITLES)
-        
+  print(SUBTITLES if multiple else next(iter(SUBTITLES.values()), []))
@@ -8,115 +8,70 @@ import tempfile
 from pathlib import Path
 from datetime import datetime, timedelta
 
-from mpeg2ts.packet import Packet
-from mpeg2ts.section import Section
-from mpeg2ts.parser import SectionParser, PESParser
-from mpeg2ts.mjd import BCD, MJD_to_YMD
-from subtitle.vtt import VTTGenerator
-
-def timestamp(delta):
-  sec = delta.seconds % 60
-  min = delta.seconds // 60 % 60
-  hour = delta.seconds // 3600
-  return f"{hour}:{min:02}:{sec:02}.{delta.microseconds // 1000}"
+from mpeg2ts.reader import open_reader
+from mpeg2ts.program import ProgramDemuxer
+from subtitle.decoder import CaptionDecoders
+from subtitle.vtt import VTTGenerator, VTTWriter, HLSWriter
 
 if __name__ == "__main__":
   parser = argparse.ArgumentParser(description=('ARIB subtitle renderer'))
 
   parser.add_argument('-i', '--input', type=argparse.FileType('rb'), nargs='?', default=sys.stdin.buffer)
   parser.add_argument('-o', '--output', type=argparse.FileType('w'), nargs='?', default=sys.stdout)
-  parser.add_argument('-s', '--SID', type=int, nargs='?')
+  parser.add_argument('-s', '--SID', type=int, action='append')
+  parser.add_argument('-a', '--all', action='store_true')
+  parser.add_argument('-d', '--output-dir', type=Path, default=Path(os.getcwd()))
+  parser.add_argument('-f', '--flush-interval', type=float, default=VTTWriter.FLUSH_INTERVAL)
+  parser.add_argument('-w', '--wallclock', action='store_true') # TOT/TDT から求めた放送時刻 (JST) を cue の identifier にする
+  parser.add_argument('--hls', action='store_true')
+  parser.add_argument('-t', '--target-duration', type=int, default=HLSWriter.TARGET_DURATION)
+  parser.add_argument('--playlist-size', type=int, default=HLSWriter.PLAYLIST_SIZE)
 
   args = parser.parse_args()
 
-  PAT_Parser = SectionParser()
-  PMT_Parser = SectionParser()
-  TOT_Parser = SectionParser()
-  SUBTITLE_Parser = PESParser()
-
-  PMT_PID = -1
-  PCR_PID = -1
-  SUBTITLE_PID = -1
-
-  FIRST_PCR = None
-
-  SUBTITLES = []
-
-  while args.input:
-    sync_byte = b''
-    while True:
-      sync_byte = args.input.read(1)
-      if not sync_byte: break
-      if sync_byte == Packet.SYNC_BYTE: break
-    if not sync_byte: break
-
-    packet = Packet.SYNC_BYTE + args.input.read(Packet.PACKET_SIZE - 1)
-    ts = Packet(packet)
-
-    if ts.pid() == 0x00:
-      PAT_Parser.push(ts)
-      while not PAT_Parser.empty():
-        PAT = PAT_Parser.pop()
-        if PAT.CRC32() != 0: continue
-
-        begin = Section.HEADER_SIZE
-        while begin < 3 + PAT.section_length() - Section.CRC_SIZE:
-          program_number = (PAT[begin + 0] << 8) | PAT[begin + 1]
-          program_map_PID = ((PAT[begin + 2] & 0x1F) << 8) | PAT[begin + 3]
-
-          if program_number == args.SID:
-            PMT_PID = program_map_PID
-          elif PMT_PID == -1 and args.SID is None:
-            PMT_PID = program_map_PID
-
-          begin += 4
-    elif ts.pid() == PMT_PID:
-      PMT_Parser.push(ts)
-      while not PMT_Parser.empty():
-        PMT = PMT_Parser.pop()
-        if PMT.CRC32() != 0: continue
-
-        PCR_PID = ((PMT[Section.HEADER_SIZE + 0] & 0x1F) << 8) | PMT[Section.HEADER_SIZE + 1]
-        program_info_length = ((PMT[Section.HEADER_SIZE + 2] & 0x0F) << 8) | PMT[Section.HEADER_SIZE + 3]
-
-        begin = Section.HEADER_SIZE + 4 + program_info_length
-        while begin < 3 + PMT.section_length() - Section.CRC_SIZE:
-          stream_type = PMT[begin + 0]
-          elementary_PID = ((PMT[begin + 1] & 0x1F) << 8) | PMT[begin + 2]
-          ES_info_length = ((PMT[begin + 3] & 0x0F) << 8) | PMT[begin + 4]
-
-          descriptor = begin + 5
-          while descriptor < (begin + 5 + ES_info_length):
-            descriptor_tag = PMT[descriptor + 0]
-            descriptor_length = PMT[descriptor + 1]
-            if descriptor_tag == 0x52:
-              component_tag = PMT[descriptor + 2]
-              if stream_type == 0x06:
-                SUBTITLE_PID = elementary_PID
-            descriptor += 2 + descriptor_length
-
-          begin += 5 + ES_info_length
-    elif ts.pid() == PCR_PID:
-      if not FIRST_PCR:
-        FIRST_PCR = ts.pcr()
-    elif ts.pid() == SUBTITLE_PID:
-      SUBTITLE_Parser.push(ts)
-      while not SUBTITLE_Parser.empty():
-        SUBTITLE = SUBTITLE_Parser.pop()
-
-        VTT = VTTGenerator(SUBTITLE)
-        VTT.generate()
-
-        elapsed_seconds = timedelta(seconds = (((1 << 33) + (VTT.PTS() - FIRST_PCR)) % (1 << 33)) / 90000)
-        if len(SUBTITLES) > 0 and SUBTITLES[-1][1] is None:
-          SUBTITLES[-1] = (SUBTITLES[-1][0], elapsed_seconds, SUBTITLES[-1][2])
-        
-        if VTT.text:
-          if VTT.end_time:
-            SUBTITLES.append((elapsed_seconds, elapsed_seconds + timedelta(seconds=VTT.end_time), VTT.vtt))
-          else:
-            SUBTITLES.append((elapsed_seconds, None, VTT.vtt))
-  
-  WEBVTT = "WEBVTT\nX-TIMESTAMP-MAP=MPEGTS:0,LOCAL:00:00:00.000\n\n"
-  WEBVTT += "\n".join([f"{timestamp(begin)} --> {timestamp(end)}\n{vtt}\n" for begin, end, vtt in SUBTITLES])
-  args.output.write(WEBVTT)      
+  # MEMO: 複数の番組を指定した場合は output-dir に SID 毎の .vtt を書き出す
+  multiple = args.all or (args.SID is not None and len(args.SID) > 1)
+  WRITERS = dict()
+  TIMELINES = dict()
+  DECODERS = CaptionDecoders()
+
+  def writer(program):
+    if program.program_number not in WRITERS:
+      if args.hls: # MEMO: HLS の場合は output-dir に SID 毎の playlist と segment を書き出す
+        WRITERS[program.program_number] = HLSWriter(args.output_dir, str(program.program_number), program.timeline, args.target_duration, args.playlist_size)
+      elif multiple:
+        WRITERS[program.program_number] = VTTWriter(open(args.output_dir / f"{program.program_number}.vtt", 'w'), args.flush_interval)
+      elif not WRITERS: # 一つだけの場合は最初の番組だけ書き出す
+        WRITERS[program.program_number] = VTTWriter(args.output, args.flush_interval)
+    if program.program_number in WRITERS: TIMELINES[program.program_number] = program.timeline
+    if args.hls and program.program_number in WRITERS: # MEMO: segment の X-TIMESTAMP-MAP は今の番組の timeline で求める
+      WRITERS[program.program_number].timeline = program.timeline
+    return WRITERS.get(program.program_number)
+
+  for programs, SUBTITLE in ProgramDemuxer(open_reader(args.input), args.SID, args.all, True):
+    if not programs: continue
+    if SUBTITLE is None: # PCR が進んだので字幕が無くても segment を区切る (.vtt の場合は溜まった cue を flush する)
+      for program in programs:
+        if args.hls or program.program_number in WRITERS:
+          writer(program).advance(timedelta(seconds = program.timeline.time / program.timeline.HZ))
+      continue
+
+    for cue in DECODERS.feed(programs, SUBTITLE):
+      VTT = VTTGenerator(None, cue)
+      VTT.generate()
+
+      for program in programs:
+        if program.timeline.empty() or writer(program) is None: continue
+
+        elapsed_seconds = timedelta(seconds = program.timeline.seconds(VTT.PTS()))
+        end_seconds = elapsed_seconds + timedelta(seconds=VTT.end_time) if VTT.end_time else None
+        wallclock = program.timeline.datetime(VTT.PTS()) if args.wallclock else None
+        WRITERS[program.program_number].push(elapsed_seconds, end_seconds, VTT.vtt if VTT.text else None, wallclock.isoformat(timespec='milliseconds') if wallclock else None, cue.repeat)
+
+  if not args.hls and not multiple and not WRITERS:
+    WRITERS[None] = VTTWriter(args.output, args.flush_interval)
+  for program_number, output in WRITERS.items():
+    # MEMO: 最後の cue は最後の PCR の時刻まで表示されていたものとする
+    timeline = TIMELINES.get(program_number)
+    output.close(timedelta(seconds = timeline.time / timeline.HZ) if timeline is not None and not timeline.empty() else None)
+    if multiple and not args.hls: output.output.close()